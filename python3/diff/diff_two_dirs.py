@@ -1,97 +1,336 @@
 import os
+import sys
+import codecs
+import argparse
 import hashlib
 import collections
+import json
+import time
+import heapq
+import struct
+import tempfile
 import re
+import fnmatch
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import zonefile
+import inotify
 
 SERIAL_PATTERN = re.compile(r'^\s*\d+\s*;\s*serial\s*$', re.IGNORECASE)
 UUID_PATTERN = re.compile(r'version\s+\d+\s+TXT\s+[0-9a-f]{8}-([0-9a-f]{4}-){3}[0-9a-f]{12}', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+CHUNK_SIZE = 1024 * 1024  # 逐块读取文件的块大小
+WORKERS = 1               # 计算文件特征值的进程数，1 为在当前进程中串行计算
+BATCH_SIZE = 64           # 多进程时每个任务计算的文件数
+MANIFEST_DIR = None       # 各目录清单（文件 stat 和特征值）的保存目录，None 为不保存、每次全部重新计算
+MANIFEST_VERSION = 1
+RACY_WINDOW = 2           # 修改时间距现在不到这么多秒的文件不记录 stat，下次仍重新计算（mtime 精度有限）
+LINE_MEMORY_LIMIT = 256 * 1024 * 1024  # 两个文件合计超过这个大小时按行哈希计数，计数超出内存预算时写入临时文件
+SPILL_DIR = None          # 行哈希计数临时文件的目录，None 为系统临时目录
+ENTRY_COST = 160          # 内存中每个行哈希计数的大致字节数，用于由内存预算换算条数
+MAX_DIFF_LINES = 10000    # 按行哈希对比时最多列出这么多行的差异，其余只计数
+ZONE_PATTERNS = ()        # 按 zone 文件语义对比的文件名模式（如 '*.zone'、'db.*'），为空时全部按行对比
+WATCH_SETTLE = 0.5        # 监视模式下最后一个事件之后等待多久再对比（秒），同一批写入只对比一次
+WATCH_MAX_DELAY = 5       # 事件持续不断时最多等待这么久（秒）也开始对比
+
+# 二进制文件在行差异中作为一个整体出现，只保留 MD5 和长度，不读入内存
+BinaryBlob = collections.namedtuple('BinaryBlob', 'md5 length')
 
-def get_files_dict(directory):
-    """遍历目录并返回文件特征字典"""
-    files = {}
+def walk_files(directory):
+    """遍历目录，依次返回 (相对路径, 完整路径)，跳过符号链接"""
     for root, dirs, filenames in os.walk(directory):
         relative_path = os.path.relpath(root, directory)
         for filename in filenames:
             file_path = os.path.join(root, filename)
             if os.path.islink(file_path):
                 continue
-            rel_file = os.path.join(relative_path, filename)
+            yield os.path.join(relative_path, filename), file_path
+
+def _tree_root(file_path, rel_file):
+    """由文件的完整路径和相对路径得到所在目录树的根"""
+    path = os.path.abspath(file_path)
+    for _ in os.path.normpath(rel_file).split(os.sep):
+        path = os.path.dirname(path)
+    return path
+
+def is_zone_file(rel_file, zone_patterns):
+    name = os.path.basename(rel_file)
+    return any(fnmatch.fnmatch(name, pattern) for pattern in zone_patterns)
+
+def _hash_batch(batch, zone_patterns=()):
+    """在工作进程中计算一批文件的特征值，返回 [(相对路径, 完整路径, 特征值, 错误)]"""
+    hashed = []
+    for rel_file, file_path in batch:
+        try:
+            digest = hash_file(file_path, is_zone_file(rel_file, zone_patterns), _tree_root(file_path, rel_file))
+            hashed.append((rel_file, file_path, digest, None))
+        except (IOError, OSError) as e:
+            hashed.append((rel_file, file_path, None, e))
+    return hashed
+
+def _fingerprint(zone_patterns=()):
+    """特征值的计算方式（版本、忽略规则和 zone 文件模式），不同时清单中的特征值不能复用或对比"""
+    rules = '\n'.join((str(MANIFEST_VERSION), SERIAL_PATTERN.pattern, UUID_PATTERN.pattern))
+    if zone_patterns:
+        rules += '\n'.join(('', 'zone', *sorted(zone_patterns), str(zonefile.IGNORE_SOA_SERIAL),
+                             str(zonefile.IGNORE_VERSION_UUID), zonefile.DEFAULT_ORIGIN))
+    return hashlib.md5(rules.encode('utf-8')).hexdigest()
+
+class Manifest:
+    """
+    一个目录的文件清单：相对路径 -> (大小, mtime_ns, inode, 特征值)
+    保存为 JSON-lines：第一行为清单信息，之后每个文件一行；
+    可作为下次运行的缓存（stat 不变的文件不再计算特征值），也可导出后代替目录参与对比
+    """
+
+    def __init__(self, root=None, entries=None, fingerprint=None):
+        self.root = root
+        self.entries = entries if entries is not None else {}
+        self.fingerprint = fingerprint or _fingerprint()
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('format') != 'diff_two_dirs manifest':
+                raise ValueError(f"{path} 不是文件清单")
+            entries = {}
+            for line in f:
+                item = json.loads(line)
+                stat = None if item.get('size') is None else (item['size'], item['mtime_ns'], item['inode'])
+                entries[item['path']] = (stat, item['hash'])
+        return cls(header.get('root'), entries, header.get('fingerprint'))
+
+    @classmethod
+    def load_cache(cls, path, fingerprint=None):
+        """读取作为缓存的清单，不存在、无法解析或计算方式已变化时返回空清单"""
+        fingerprint = fingerprint or _fingerprint()
+        try:
+            manifest = cls.load(path)
+        except (OSError, ValueError, KeyError):
+            return cls(fingerprint=fingerprint)
+        if manifest.fingerprint != fingerprint:
+            return cls(fingerprint=fingerprint)
+        return manifest
+
+    def save(self, path):
+        """先写临时文件再改名，中断时不会留下不完整的清单"""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            header = {'format': 'diff_two_dirs manifest', 'version': MANIFEST_VERSION,
+                      'fingerprint': self.fingerprint, 'root': self.root,
+                      'created': datetime.now().isoformat(timespec='seconds')}
+            f.write(json.dumps(header, ensure_ascii=False) + '\n')
+            for rel_file, (stat, digest) in self.entries.items():
+                size, mtime_ns, inode = stat or (None, None, None)
+                f.write(json.dumps({'path': rel_file, 'size': size, 'mtime_ns': mtime_ns, 'inode': inode,
+                                    'hash': digest}, ensure_ascii=False) + '\n')
+        os.replace(tmp, path)
+
+    def hashes(self):
+        return {rel_file: digest for rel_file, (stat, digest) in self.entries.items()}
+
+def manifest_path(directory, manifest_dir):
+    """目录在 manifest_dir 中对应的清单文件，按目录的绝对路径区分"""
+    key = hashlib.md5(os.path.abspath(directory).encode('utf-8')).hexdigest()
+    return os.path.join(manifest_dir, f"{key}.jsonl")
+
+def get_files_dict(directory, executor=None, manifest=None, zone_patterns=ZONE_PATTERNS):
+    """
+    遍历目录并返回文件特征字典
+    传入进程池 executor 时边遍历边按批提交，由各进程并行计算特征值，结果与串行计算相同
+    传入 manifest 时大小、mtime、inode 都未变化的文件直接使用清单中的特征值，
+    其余文件重新计算，清单随之更新为目录的当前状态
+    文件名匹配 zone_patterns 的文件按 zone 语义计算特征值（见 hash_file）
+    """
+    files = {}  # 按遍历顺序，先占位，计算完成后填入特征值
+    stats = {}
+    pending = []  # 串行时为各批的结果，有进程池时为各批的 future
+    batch = []
+    batch_size = BATCH_SIZE if executor is not None else 1
+
+    def submit(batch):
+        if executor is None:
+            pending.append(_hash_batch(batch, zone_patterns))
+        else:
+            pending.append(executor.submit(_hash_batch, batch, zone_patterns))
+
+    now = time.time_ns()
+    for rel_file, file_path in walk_files(directory):
+        if manifest is not None:
             try:
-                files[rel_file] = hash_file(file_path)
-            except (IOError, OSError) as e:
+                st = os.stat(file_path)
+            except OSError as e:
                 print(f"无法读取文件 {file_path}: {e}")
+                continue
+            stat = (st.st_size, st.st_mtime_ns, st.st_ino)
+            cached_stat, digest = manifest.entries.get(rel_file, (None, None))
+            if cached_stat is not None and tuple(cached_stat) == stat:
+                files[rel_file] = digest
+                stats[rel_file] = stat
+                continue
+            stats[rel_file] = stat if now - st.st_mtime_ns > RACY_WINDOW * 10 ** 9 else None
+        files[rel_file] = None
+        batch.append((rel_file, file_path))
+        if len(batch) >= batch_size:
+            submit(batch)
+            batch = []
+    if batch:
+        submit(batch)
+
+    for item in pending:
+        for rel_file, file_path, digest, error in (item if executor is None else item.result()):
+            if error is not None:
+                print(f"无法读取文件 {file_path}: {error}")
+                del files[rel_file]
+            else:
+                files[rel_file] = digest
+
+    if manifest is not None:
+        manifest.root = os.path.abspath(directory)
+        manifest.entries = {rel_file: (stats[rel_file], digest) for rel_file, digest in files.items()}
     return files
 
+def load_files_dict(path, executor=None, manifest_dir=None, zone_patterns=ZONE_PATTERNS):
+    """目录返回其文件特征字典（有 manifest_dir 时读取并更新其中的清单）；清单文件直接返回其中的特征值"""
+    if os.path.isfile(path):
+        manifest = Manifest.load(path)
+        if manifest.fingerprint != _fingerprint(zone_patterns):
+            raise ValueError(f"清单 {path} 的特征值计算方式（或 zone 文件模式）与当前不同，请重新导出")
+        return manifest.hashes()
+    if manifest_dir is None:
+        return get_files_dict(path, executor, zone_patterns=zone_patterns)
+    cache = manifest_path(path, manifest_dir)
+    manifest = Manifest.load_cache(cache, _fingerprint(zone_patterns))
+    files = get_files_dict(path, executor, manifest, zone_patterns)
+    os.makedirs(manifest_dir, exist_ok=True)
+    manifest.save(cache)
+    return files
+
+def scan_directories(dir1, dir2, workers=WORKERS, manifest_dir=MANIFEST_DIR, zone_patterns=ZONE_PATTERNS):
+    """计算两侧（目录或清单文件）的文件特征字典；workers > 1 时两个目录同时遍历，共用一个进程池计算特征值"""
+    if workers <= 1:
+        return (load_files_dict(dir1, None, manifest_dir, zone_patterns),
+                load_files_dict(dir2, None, manifest_dir, zone_patterns))
+    with ProcessPoolExecutor(max_workers=workers) as executor, ThreadPoolExecutor(max_workers=2) as walkers:
+        files1 = walkers.submit(load_files_dict, dir1, executor, manifest_dir, zone_patterns)
+        files2 = walkers.submit(load_files_dict, dir2, executor, manifest_dir, zone_patterns)
+        return files1.result(), files2.result()
+
+def export_manifest(directory, path, workers=WORKERS, manifest_dir=MANIFEST_DIR, zone_patterns=ZONE_PATTERNS):
+    """计算目录的清单并写入 path，可复制到其他主机后代替目录参与对比（对比时需使用相同的 zone 文件模式）"""
+    fingerprint = _fingerprint(zone_patterns)
+    if manifest_dir:
+        manifest = Manifest.load_cache(manifest_path(directory, manifest_dir), fingerprint)
+    else:
+        manifest = Manifest(fingerprint=fingerprint)
+    if workers <= 1:
+        get_files_dict(directory, None, manifest, zone_patterns)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            get_files_dict(directory, executor, manifest, zone_patterns)
+    manifest.save(path)
+    if manifest_dir:
+        os.makedirs(manifest_dir, exist_ok=True)
+        manifest.save(manifest_path(directory, manifest_dir))
+    return manifest
+
 def normalize_line(line_bytes):
     """规范化行内容：去除首尾空格，合并中间连续空格"""
     try:
         # 解码为字符串并处理
         line_str = line_bytes.decode('utf-8').strip()
-        # 合并所有连续空白字符为单个空格
-        line_normalized = re.sub(r'\s+', ' ', line_str)
-        return line_normalized.encode('utf-8')
     except UnicodeDecodeError:
         # 保持二进制行不变
         return line_bytes
+    # 合并所有连续空白字符为单个空格
+    return WHITESPACE_PATTERN.sub(' ', line_str).encode('utf-8')
 
-def hash_file(filepath):
-    """计算文件特征值（包含规范化处理）"""
-    try:
-        with open(filepath, 'rb') as f:
-            content = f.read()
-            content.decode('utf-8')
-        is_text = True
-    except UnicodeDecodeError:
-        is_text = False
+def _emit_lines(text, final, on_line):
+    """
+    把已解码的文本按行（\n、\r\n、\r，与文本模式读取相同）切分，过滤并规范化后交给 on_line，
+    返回末尾不完整的一行，留到下一块继续拼接
+    """
+    keep = ''
+    if not final and text.endswith('\r'):
+        # \r 可能与下一块开头的 \n 组成一个换行
+        text, keep = text[:-1], '\r'
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    rest = lines.pop()
+    if final and rest:
+        lines.append(rest)
+    for line in lines:
+        line = line.strip()
+        if not (SERIAL_PATTERN.match(line) or UUID_PATTERN.search(line)):
+            on_line(WHITESPACE_PATTERN.sub(' ', line).encode('utf-8'))
+    return '' if final else rest + keep
 
-    if is_text:
-        lines = []
-        with open(filepath, 'r', encoding='utf-8') as f:
-            for line in f:
-                line_bytes = line.encode('utf-8')
-                if should_ignore_line(line_bytes):
-                    continue
-                normalized = normalize_line(line_bytes)
-                lines.append(normalized)
-        lines.sort()
-        hasher = hashlib.md5()
-        for line in lines:
-            hasher.update(line)
-        return hasher.hexdigest()
-    else:
-        with open(filepath, 'rb') as f:
-            return hashlib.md5(f.read()).hexdigest()
+def scan_file(filepath, on_line):
+    """
+    单遍读取文件：逐块增量解码 UTF-8，每一行过滤并规范化后交给 on_line(行字节)，同时计算原始内容的 MD5
+    遇到无法解码的内容即判定为二进制文件，之后只计算 MD5（此时已交给 on_line 的行应丢弃）
+    返回 (是否文本文件, 原始内容的 MD5 对象)
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    raw = hashlib.md5()
+    is_text = True
+    pending = ''
+    with open(filepath, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            final = not chunk
+            raw.update(chunk)
+            if is_text:
+                try:
+                    pending = _emit_lines(pending + decoder.decode(chunk, final), final, on_line)
+                except UnicodeDecodeError:
+                    is_text = False
+            if final:
+                return is_text, raw
 
-def compare_file_lines(file1, file2):
-    def filtered_counter(filepath):
+class MultisetHash:
+    """
+    与行顺序无关的多重集合哈希：每行的 MD5 视为 128 位整数按模 2^128 累加，
+    不需要保存和排序全部行，相同的行出现多次时各计一次
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    def add(self, line):
+        self.total = (self.total + int.from_bytes(hashlib.md5(line).digest(), 'big')) & ((1 << 128) - 1)
+        self.count += 1
+
+    def hexdigest(self):
+        return hashlib.md5(self.total.to_bytes(16, 'big') + self.count.to_bytes(8, 'big')).hexdigest()
+
+def hash_file(filepath, zone=False, root=None):
+    """
+    计算文件特征值（包含规范化处理）：文本文件为规范化行的多重集合哈希，二进制文件为内容的 MD5
+    zone 为真时为规范化后各 RRset 的哈希，与记录顺序和写法无关；无法按 zone 文件解析时仍按行计算
+    root 为文件所在的目录树的根，$INCLUDE 不能引用其外的文件
+    """
+    if zone:
         try:
-            with open(filepath, 'rb') as f:
-                content = f.read()
-                content.decode('utf-8')
-            is_text = True
-        except UnicodeDecodeError:
-            is_text = False
+            return zonefile.zone_digest(filepath, root=root)
+        except (zonefile.ZoneError, UnicodeDecodeError):
+            pass
+    lines = MultisetHash()
 
-        if is_text:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                lines = [
-                    normalize_line(line.encode('utf-8'))
-                    for line in f
-                    if not should_ignore_line(line.encode('utf-8'))
-                ]
-        else:
-            with open(filepath, 'rb') as f:
-                lines = [f.read()]
+    def add(line):
+        # 空行不计入特征值，只有空行数量不同的文件视为相同
+        if line:
+            lines.add(line)
 
-        return collections.Counter(lines)
-    counter1 = filtered_counter(file1)
-    counter2 = filtered_counter(file2)
+    is_text, raw = scan_file(filepath, add)
+    return lines.hexdigest() if is_text else raw.hexdigest()
 
-    # 判断是否存在有效差异
-    if counter1 == counter2:
-        return False, None  # 无实质差异
+def _binary_blob(filepath, raw):
+    return BinaryBlob(raw.hexdigest(), os.path.getsize(filepath))
 
-    # 初始化差异字典
+def _diff_counters(counter1, counter2):
+    """由两个 {行: 次数} 得到差异字典，各部分按行在文件中首次出现的顺序排列"""
     diff_result = {
         'dir1_only': {},
         'dir2_only': {},
@@ -110,27 +349,501 @@ def compare_file_lines(file1, file2):
     for line, count2 in counter2.items():
         if line not in counter1:
             diff_result['dir2_only'][line] = count2
-    return True, diff_result
+    return diff_result
 
-def compare_directories(dir1, dir2):
-    """比较目录并过滤无效差异"""
-    files1 = get_files_dict(dir1)
-    files2 = get_files_dict(dir2)
-
-    modified_details = {}
-    for f in set(files1.keys()) & set(files2.keys()):
-        if files1[f] != files2[f]:  # 特征值不同才比较细节
-            file1_path = os.path.join(dir1, f)
-            file2_path = os.path.join(dir2, f)
-            has_diff, diff = compare_file_lines(file1_path, file2_path)
-            if has_diff:  # 仅保留有效差异
-                modified_details[f] = diff
-    return {
-        'added': set(files2.keys()) - set(files1.keys()),
-        'removed': set(files1.keys()) - set(files2.keys()),
-        'modified': modified_details,  # 已过滤无实质差异的文件
-        'common': set(files1.keys()) & set(files2.keys())
+def compare_file_lines(file1, file2, memory_limit=LINE_MEMORY_LIMIT):
+    """
+    按规范化后的行（多重集合）对比两个文件，返回 (是否有差异, 差异字典)
+    两个文件合计超过 memory_limit 字节时改用 compare_file_lines_bounded，内存占用不随文件大小增长
+    """
+    try:
+        total = os.path.getsize(file1) + os.path.getsize(file2)
+    except OSError:
+        total = 0
+    if total > memory_limit:
+        return compare_file_lines_bounded(file1, file2, memory_limit)
+
+    def filtered_counter(filepath):
+        counter = collections.Counter()
+
+        def add(line):
+            counter[line] += 1
+
+        is_text, raw = scan_file(filepath, add)
+        if is_text:
+            return counter
+        return collections.Counter([_binary_blob(filepath, raw)])
+    counter1 = filtered_counter(file1)
+    counter2 = filtered_counter(file2)
+
+    # 判断是否存在有效差异
+    if counter1 == counter2:
+        return False, None  # 无实质差异
+    return True, _diff_counters(counter1, counter2)
+
+RECORD = struct.Struct('>16sQ')  # 临时文件中的一条计数：行的 MD5、出现次数
+
+class LineHashCounter:
+    """
+    按行的 MD5（16 字节）计数；内存中的条数超过 max_entries 时排序后写入一个临时文件，
+    items() 对各临时文件和内存中的计数多路归并，按哈希顺序返回 (哈希, 次数)
+    """
+
+    def __init__(self, max_entries, spill_dir=SPILL_DIR):
+        self.max_entries = max_entries
+        self.spill_dir = spill_dir
+        self.counts = {}
+        self.runs = []
+
+    def add_digest(self, digest, count=1):
+        self.counts[digest] = self.counts.get(digest, 0) + count
+        if len(self.counts) >= self.max_entries:
+            self._spill()
+
+    def add(self, line):
+        self.add_digest(hashlib.md5(line).digest())
+
+    def _spill(self):
+        run = tempfile.TemporaryFile(dir=self.spill_dir)
+        for digest in sorted(self.counts):
+            run.write(RECORD.pack(digest, self.counts[digest]))
+        run.seek(0)
+        self.runs.append(run)
+        self.counts = {}
+
+    @staticmethod
+    def _read(run):
+        while True:
+            data = run.read(RECORD.size * 4096)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data)
+
+    def items(self):
+        merged = heapq.merge(*(self._read(run) for run in self.runs), sorted(self.counts.items()))
+        current, total = None, 0
+        for digest, count in merged:
+            if digest != current:
+                if current is not None:
+                    yield current, total
+                current, total = digest, 0
+            total += count
+        if current is not None:
+            yield current, total
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+        self.counts = {}
+
+def _count_lines(filepath, max_entries):
+    """返回 (LineHashCounter, 二进制文件的 BinaryBlob 或 None)；二进制文件只计一条"""
+    counter = LineHashCounter(max_entries)
+    is_text, raw = scan_file(filepath, counter.add)
+    if is_text:
+        return counter, None
+    counter.close()
+    blob = _binary_blob(filepath, raw)
+    counter.add_digest(_blob_digest(blob))
+    return counter, blob
+
+def _blob_digest(blob):
+    return hashlib.md5(f"{blob.md5}:{blob.length}".encode()).digest()
+
+def _differing_counts(items1, items2, limit=None):
+    """
+    归并两个按哈希排序的计数流，返回 (次数不同的 {哈希: (次数1, 次数2)}, 未列出的个数)
+    limit 为最多保留的条数，超出的只计数，内存占用不随差异的多少增长
+    """
+    differing = {}
+    omitted = 0
+
+    def add(digest, counts):
+        nonlocal omitted
+        if limit is not None and len(differing) >= limit:
+            omitted += 1
+        else:
+            differing[digest] = counts
+
+    items1, items2 = iter(items1), iter(items2)
+    a, b = next(items1, None), next(items2, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            add(a[0], (a[1], 0))
+            a = next(items1, None)
+        elif a is None or b[0] < a[0]:
+            add(b[0], (0, b[1]))
+            b = next(items2, None)
+        else:
+            if a[1] != b[1]:
+                add(a[0], (a[1], b[1]))
+            a, b = next(items1, None), next(items2, None)
+    return differing, omitted
+
+def _resolve_lines(filepath, blob, wanted):
+    """再读一遍文件，按首次出现的顺序找出哈希在 wanted 中的行的内容"""
+    if blob is not None:
+        digest = _blob_digest(blob)
+        return {digest: blob} if digest in wanted else {}
+    found = {}
+
+    def add(line):
+        digest = hashlib.md5(line).digest()
+        if digest in wanted and digest not in found:
+            found[digest] = line
+
+    scan_file(filepath, add)
+    return found
+
+def compare_file_lines_bounded(file1, file2, memory_limit=LINE_MEMORY_LIMIT):
+    """
+    内存有界的行对比，结果与 compare_file_lines 相同：
+    每个文件按行哈希计数（两个计数各用一半内存预算，超出的部分排序后写入临时文件），
+    归并两侧的计数找出次数不同的哈希，再各读一遍文件，只把这些哈希还原为行内容；
+    二进制文件流式计算 MD5，作为一个整体参与对比
+    不同的行超过 MAX_DIFF_LINES 时只列出其中一部分（按哈希顺序选取），
+    差异字典中的 'omitted' 为未列出的行数
+    """
+    max_entries = max(10000, memory_limit // 2 // ENTRY_COST)
+    counter1, blob1 = _count_lines(file1, max_entries)
+    try:
+        counter2, blob2 = _count_lines(file2, max_entries)
+        try:
+            differing, omitted = _differing_counts(counter1.items(), counter2.items(), MAX_DIFF_LINES)
+        finally:
+            counter2.close()
+    finally:
+        counter1.close()
+    if not differing:
+        return False, None
+
+    diff_result = {
+        'dir1_only': {},
+        'dir2_only': {},
+        'common_diff': {}
     }
+    lines1 = _resolve_lines(file1, blob1, {digest for digest, (c1, c2) in differing.items() if c1})
+    for digest, line in lines1.items():
+        c1, c2 = differing[digest]
+        if c2 == 0:
+            diff_result['dir1_only'][line] = c1
+        else:
+            diff_result['common_diff'][line] = (c1, c2)
+    lines2 = _resolve_lines(file2, blob2, {digest for digest, (c1, c2) in differing.items() if not c1})
+    for digest, line in lines2.items():
+        diff_result['dir2_only'][line] = differing[digest][1]
+    if omitted:
+        diff_result['omitted'] = omitted
+    return True, diff_result
+
+def compare_zone_files(file1, file2, memory_limit=LINE_MEMORY_LIMIT, root1=None, root2=None):
+    """
+    按 zone 语义对比，返回 (是否有差异, {'zone': {名字: {'added', 'removed', 'changed'}}})
+    任一文件无法按 zone 文件解析时退回按行对比；root1 / root2 见 hash_file
+    """
+    try:
+        has_diff, names = zonefile.compare_zone_files(file1, file2, root1=root1, root2=root2)
+    except (zonefile.ZoneError, UnicodeDecodeError):
+        return compare_file_lines(file1, file2, memory_limit)
+    return (True, {'zone': names}) if has_diff else (False, None)
+
+def compare_file(dir1, dir2, rel_file, memory_limit=LINE_MEMORY_LIMIT, zone_patterns=ZONE_PATTERNS):
+    """对比两个目录中特征值不同的同名文件，返回差异字典，没有实质差异时返回 None"""
+    file1_path = os.path.join(dir1, rel_file)
+    file2_path = os.path.join(dir2, rel_file)
+    if is_zone_file(rel_file, zone_patterns):
+        has_diff, diff = compare_zone_files(file1_path, file2_path, memory_limit, dir1, dir2)
+    else:
+        has_diff, diff = compare_file_lines(file1_path, file2_path, memory_limit)
+    return diff if has_diff else None
+
+def _compare_batch(batch, zone_patterns=()):
+    """
+    在工作进程中对比一批文件的特征值，batch 为 [(相对路径, 完整路径1, 完整路径2 或 None)]
+    返回 [(相对路径, 'removed' / 'same' / 'differ' / 'error', 错误信息)]
+    """
+    compared = []
+    for rel_file, path1, path2 in batch:
+        if path2 is None:
+            compared.append((rel_file, 'removed', None))
+            continue
+        zone = is_zone_file(rel_file, zone_patterns)
+        try:
+            same = (hash_file(path1, zone, _tree_root(path1, rel_file)) ==
+                    hash_file(path2, zone, _tree_root(path2, rel_file)))
+        except (IOError, OSError) as e:
+            compared.append((rel_file, 'error', str(e)))
+            continue
+        compared.append((rel_file, 'same' if same else 'differ', None))
+    return compared
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _run_batches(executor, func, batches, ahead, *args):
+    """按顺序返回各批的结果；有进程池时最多提前提交 ahead 批，边遍历边计算"""
+    if executor is None:
+        for batch in batches:
+            yield func(batch, *args)
+        return
+    pending = collections.deque()
+    for batch in batches:
+        pending.append(executor.submit(func, batch, *args))
+        if len(pending) >= ahead:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def _iter_compare_hashed(dir1, dir2, workers, manifest_dir, memory_limit, zone_patterns, details):
+    """先计算两侧完整的特征字典（清单文件或使用 manifest_dir 时）再逐个对比"""
+    files1, files2 = scan_directories(dir1, dir2, workers, manifest_dir, zone_patterns)
+    local = os.path.isdir(dir1) and os.path.isdir(dir2)
+    for f, digest in files1.items():
+        if f not in files2:
+            yield 'removed', f, None
+        elif digest == files2[f]:
+            yield 'same', f, None
+        elif not local or not details:
+            yield 'modified', f, None  # 只有清单，只知道特征值不同
+        else:
+            diff = compare_file(dir1, dir2, f, memory_limit, zone_patterns)
+            yield ('modified', f, diff) if diff is not None else ('same', f, None)
+    for f in files2:
+        if f not in files1:
+            yield 'added', f, None
+
+def iter_compare(dir1, dir2, workers=WORKERS, manifest_dir=MANIFEST_DIR, memory_limit=LINE_MEMORY_LIMIT,
+                 zone_patterns=ZONE_PATTERNS, details=True):
+    """
+    逐个文件对比两个目录，依次返回 (状态, 相对路径, 差异)
+    状态为 'added'、'removed'、'modified'、'same' 或 'error'（无法读取，第三项为错误信息）；
+    差异只在 modified 时有值，details 为假时不计算差异详情（特征值不同即为 modified），
+    清单文件一侧的 modified 也没有详情
+    两侧都是目录且没有 manifest_dir 时边遍历 dir1 边对比，之后遍历 dir2 找出新增的文件，
+    结果随对比进度产生，提前结束迭代（如遇到第一个差异即退出）时不再计算剩余的文件
+    """
+    if manifest_dir is not None or not (os.path.isdir(dir1) and os.path.isdir(dir2)):
+        yield from _iter_compare_hashed(dir1, dir2, workers, manifest_dir, memory_limit, zone_patterns, details)
+        return
+
+    seen = set()
+
+    def pairs():
+        for rel_file, path1 in walk_files(dir1):
+            seen.add(rel_file)
+            path2 = os.path.join(dir2, rel_file)
+            yield rel_file, path1, path2 if os.path.isfile(path2) and not os.path.islink(path2) else None
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        batches = _batches(pairs(), BATCH_SIZE if executor is not None else 1)
+        for batch in _run_batches(executor, _compare_batch, batches, workers * 2, zone_patterns):
+            for rel_file, status, error in batch:
+                if status == 'differ':
+                    diff = compare_file(dir1, dir2, rel_file, memory_limit, zone_patterns) if details else None
+                    if diff is None and details:
+                        yield 'same', rel_file, None
+                    else:
+                        yield 'modified', rel_file, diff
+                else:
+                    yield status, rel_file, error
+        for rel_file, _ in walk_files(dir2):
+            if rel_file not in seen:
+                yield 'added', rel_file, None
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+def compare_directories(dir1, dir2, workers=WORKERS, manifest_dir=MANIFEST_DIR, memory_limit=LINE_MEMORY_LIMIT,
+                        zone_patterns=ZONE_PATTERNS):
+    """
+    比较目录并过滤无效差异，workers 为计算特征值的进程数，memory_limit 见 compare_file_lines
+    文件名匹配 zone_patterns 的文件按 zone 语义对比，差异详情为各名字下的记录变化（见 compare_zone_files）
+    dir1 / dir2 也可以是 export_manifest 导出的清单文件，此时特征值不同的文件没有行差异详情（值为 None）
+    汇总 iter_compare 的全部结果，需要边对比边输出时直接使用 iter_compare
+    """
+    results = {'added': set(), 'removed': set(), 'modified': {}, 'common': set()}
+    for status, rel_file, diff in iter_compare(dir1, dir2, workers, manifest_dir, memory_limit, zone_patterns):
+        if status == 'error':
+            print(f"无法读取文件 {rel_file}: {diff}")
+        elif status in ('added', 'removed'):
+            results[status].add(rel_file)
+        else:
+            results['common'].add(rel_file)
+            if status == 'modified':  # 已过滤无实质差异的文件
+                results['modified'][rel_file] = diff
+    return results
+
+def stream_results(results, emit, brief=False):
+    """
+    把 iter_compare 的结果逐个交给 emit（相同的文件不输出），最后是 {'event': 'summary', 各类文件数}
+    brief 为真时遇到第一个差异即停止（不再输出 summary）；返回是否有差异（无法读取的文件也算作差异）
+    """
+    counts = dict.fromkeys(('added', 'removed', 'modified', 'same', 'error'), 0)
+    try:
+        for status, rel_file, diff in results:
+            counts[status] += 1
+            if status == 'same':
+                continue
+            event = {'event': status, 'path': rel_file}
+            if status == 'error':
+                event['error'] = diff
+            else:
+                event['diff'] = diff_to_json(diff)
+            emit(event)
+            if brief:
+                return True
+    finally:
+        results.close()
+    emit({'event': 'summary', **counts})
+    return counts['same'] != sum(counts.values())
+
+class DirectoryState:
+    """
+    两个目录当前的对比结果，results 与 compare_directories 的返回值相同，可按文件增量更新
+    update(相对路径) 重新计算该文件两侧的特征值并更新结果，文件的差异状态变化时返回事件字典
+    """
+
+    def __init__(self, dir1, dir2, files1, files2, memory_limit=LINE_MEMORY_LIMIT, zone_patterns=ZONE_PATTERNS):
+        self.dir1 = dir1
+        self.dir2 = dir2
+        self.memory_limit = memory_limit
+        self.zone_patterns = zone_patterns
+        self.files1 = {}
+        self.files2 = {}
+        self.results = {'added': set(), 'removed': set(), 'modified': {}, 'common': set()}
+        self.reload(files1, files2)
+
+    def status(self, rel_file):
+        """'added'、'removed'、'modified'、'same'（两侧相同），两侧都没有时为 None"""
+        for status in ('added', 'removed', 'modified'):
+            if rel_file in self.results[status]:
+                return status
+        return 'same' if rel_file in self.results['common'] else None
+
+    def under(self, rel_dir):
+        """已知的位于 rel_dir 下的文件"""
+        prefix = rel_dir + os.sep
+        return {f for f in self.files1.keys() | self.files2.keys() if f.startswith(prefix)}
+
+    def _classify(self, rel_file):
+        results = self.results
+        for status in ('added', 'removed', 'common'):
+            results[status].discard(rel_file)
+        results['modified'].pop(rel_file, None)
+        in1, in2 = rel_file in self.files1, rel_file in self.files2
+        if in1 and in2:
+            results['common'].add(rel_file)
+            if self.files1[rel_file] != self.files2[rel_file]:
+                diff = compare_file(self.dir1, self.dir2, rel_file, self.memory_limit, self.zone_patterns)
+                if diff is not None:
+                    results['modified'][rel_file] = diff
+        elif in2:
+            results['added'].add(rel_file)
+        elif in1:
+            results['removed'].add(rel_file)
+
+    def _rehash(self, files, directory, rel_file):
+        path = os.path.join(directory, rel_file)
+        try:
+            if os.path.islink(path) or not os.path.isfile(path):
+                files.pop(rel_file, None)
+            else:
+                files[rel_file] = hash_file(path, is_zone_file(rel_file, self.zone_patterns), directory)
+        except (IOError, OSError):
+            files.pop(rel_file, None)  # 计算期间被删除或无法读取，之后的事件会再次触发对比
+
+    def _snapshot(self, rel_file):
+        return self.status(rel_file), self.results['modified'].get(rel_file)
+
+    def event(self, rel_file, before=(None, None)):
+        """文件的差异状态相对 before 有变化时返回事件：added / removed / modified，或不再有差异时的 resolved"""
+        status, diff = self._snapshot(rel_file)
+        if (status, diff) == before:
+            return None
+        divergent = status in ('added', 'removed', 'modified')
+        if not divergent and before[0] not in ('added', 'removed', 'modified'):
+            return None
+        return {'time': datetime.now().isoformat(timespec='seconds'),
+                'event': status if divergent else 'resolved', 'path': rel_file, 'diff': diff_to_json(diff)}
+
+    def update(self, rel_file):
+        before = self._snapshot(rel_file)
+        self._rehash(self.files1, self.dir1, rel_file)
+        self._rehash(self.files2, self.dir2, rel_file)
+        self._classify(rel_file)
+        return self.event(rel_file, before)
+
+    def reload(self, files1, files2):
+        """用完整扫描的结果替换当前状态，返回状态变化的文件的事件"""
+        before = {f: self._snapshot(f) for f in self.files1.keys() | self.files2.keys()}
+        self.files1, self.files2 = dict(files1), dict(files2)
+        events = []
+        for rel_file in sorted(before.keys() | self.files1.keys() | self.files2.keys()):
+            self._classify(rel_file)
+            event = self.event(rel_file, before.get(rel_file, (None, None)))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def summary(self, event):
+        results = self.results
+        return {'time': datetime.now().isoformat(timespec='seconds'), 'event': event,
+                'added': len(results['added']), 'removed': len(results['removed']),
+                'modified': len(results['modified']), 'common': len(results['common'])}
+
+def watch_directories(dir1, dir2, emit, workers=WORKERS, manifest_dir=MANIFEST_DIR, memory_limit=LINE_MEMORY_LIMIT,
+                      zone_patterns=ZONE_PATTERNS, settle=WATCH_SETTLE, max_delay=WATCH_MAX_DELAY):
+    """
+    持续对比两个目录：先完整对比一次，之后跟随两个目录树的 inotify 事件，只重新对比变化的文件
+    emit(event) 依次收到：初始的各个差异文件、{'event': 'ready', 各类文件数}，之后每个文件差异状态的变化；
+    事件队列溢出或根目录被替换时重新完整扫描，发出变化的文件和 {'event': 'rescan', ...}
+    一直运行，直到 emit 或调用者抛出异常（如 KeyboardInterrupt）；返回前关闭 inotify
+    """
+    with inotify.TreeWatcher([dir1, dir2]) as watcher:
+        # 先开始监视再扫描，扫描期间的变化也会在之后处理
+        files1, files2 = scan_directories(dir1, dir2, workers, manifest_dir, zone_patterns)
+        state = DirectoryState(dir1, dir2, {}, {}, memory_limit, zone_patterns)
+        for event in state.reload(files1, files2):
+            emit(event)
+        emit(state.summary('ready'))
+
+        touched, first = set(), None
+        while True:
+            timeout = None if first is None else max(0.0, min(settle, first + max_delay - time.monotonic()))
+            changes = watcher.read(timeout)
+            if changes is None:
+                watcher.rewatch()
+                files1, files2 = scan_directories(dir1, dir2, workers, manifest_dir, zone_patterns)
+                for event in state.reload(files1, files2):
+                    emit(event)
+                emit(state.summary('rescan'))
+                touched, first = set(), None
+                continue
+            files, dirs = changes
+            touched |= files
+            for rel_dir in dirs:
+                touched |= state.under(rel_dir)
+            if files or dirs:
+                first = first if first is not None else time.monotonic()
+                if time.monotonic() - first < max_delay:
+                    continue
+            if not touched:
+                first = None
+                continue
+            for rel_file in sorted(touched):
+                event = state.update(rel_file)
+                if event is not None:
+                    emit(event)
+            touched, first = set(), None
 
 def read_lines(filepath):
     """读取文件的所有行（二进制模式）"""
@@ -151,6 +864,8 @@ def should_ignore_line(line_bytes):
 
 def format_line(line_bytes, max_length=80):
     """格式化单行内容为可读字符串"""
+    if isinstance(line_bytes, BinaryBlob):
+        return f"<二进制行 MD5:{line_bytes.md5} 长度:{line_bytes.length}>"
     try:
         stripped = line_bytes.rstrip(b'\n\r')
         decoded = stripped.decode('utf-8')
@@ -161,6 +876,48 @@ def format_line(line_bytes, max_length=80):
         hash_md5 = hashlib.md5(line_bytes).hexdigest()
         return f"<二进制行 MD5:{hash_md5} 长度:{len(line_bytes)}>"
 
+def _line_text(line):
+    if isinstance(line, bytes):
+        try:
+            return line.rstrip(b'\n\r').decode('utf-8')
+        except UnicodeDecodeError:
+            pass
+    return format_line(line)
+
+def diff_to_json(diff):
+    """差异字典转换为可 JSON 序列化的形式（行为字符串，二进制行为摘要），zone 差异和 None 原样返回"""
+    if diff is None or 'zone' in diff:
+        return diff
+    return {
+        'dir1_only': [{'line': _line_text(line), 'count': count} for line, count in diff['dir1_only'].items()],
+        'dir2_only': [{'line': _line_text(line), 'count': count} for line, count in diff['dir2_only'].items()],
+        'common_diff': [{'line': _line_text(line), 'count1': c1, 'count2': c2}
+                        for line, (c1, c2) in diff['common_diff'].items()],
+        'omitted': diff.get('omitted', 0),
+    }
+
+def print_event(event):
+    print(json.dumps(event, ensure_ascii=False), flush=True)
+
+def print_brief(event):
+    """--brief 的输出：第一个差异，或没有差异"""
+    if event['event'] == 'summary':
+        print("两个目录没有差异")
+    else:
+        labels = {'added': '新增文件', 'removed': '缺失文件', 'modified': '内容不同的文件', 'error': '无法读取的文件'}
+        print(f"发现差异：{labels[event['event']]} {event['path']}")
+
+def print_zone_diff(names):
+    """按名字输出 zone 文件的记录差异"""
+    for owner, changes in names.items():
+        print(f"    {owner}")
+        for record in changes['removed']:
+            print(f"      - {record}")
+        for record in changes['added']:
+            print(f"      + {record}")
+        for change in changes['changed']:
+            print(f"      * {change}")
+
 def print_results(results):
     """格式化输出比较结果，包括详细的行差异"""
     print("\n对比结果：")
@@ -176,6 +933,12 @@ def print_results(results):
     for f in sorted(results['modified']):
         print(f"  * {f}")
         diff_info = results['modified'][f]
+        if diff_info is None:
+            continue
+        if 'zone' in diff_info:
+            print_zone_diff(diff_info['zone'])
+            print()
+            continue
 
         dir1_only = diff_info['dir1_only']
         if dir1_only:
@@ -198,21 +961,77 @@ def print_results(results):
                 line_str = format_line(line)
                 print(f"      * 行 '{line_str}': 源目录 {c1} 次 vs 目标目录 {c2} 次")
 
+        if diff_info.get('omitted'):
+            print(f"    另有 {diff_info['omitted']} 行的差异未列出（超过 {MAX_DIFF_LINES} 行）")
+
         print()  # 空行分隔不同文件
 
     common_count = len(results['common']) - len(results['modified'])
     print(f"\n相同文件 ({common_count})")
-import sys
-if __name__ == "__main__":
 
-    dir1 = sys.argv[1]
-    dir2 = sys.argv[2]
-    if not os.path.isdir(dir1):
-        print(f"错误：目录 {dir1} 不存在")
-        exit(1)
-    if not os.path.isdir(dir2):
-        print(f"错误：目录 {dir2} 不存在")
-        exit(1)
-
-    results = compare_directories(dir1, dir2)
-    print_results(results)
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="对比两个目录中的文件内容差异")
+    parser.add_argument("dir1", help="源目录，或导出的清单文件")
+    parser.add_argument("dir2", nargs="?", help="目标目录，或导出的清单文件")
+    parser.add_argument("-j", "--workers", type=int, default=WORKERS,
+                        help="计算文件特征值的进程数，0 为 CPU 核数，默认 %(default)s（串行）")
+    parser.add_argument("--manifest-dir", default=MANIFEST_DIR,
+                        help="在该目录中保存各目录的清单，下次只重新计算 stat 变化的文件")
+    parser.add_argument("--max-memory", type=int, default=LINE_MEMORY_LIMIT // (1024 * 1024), metavar="MB",
+                        help="两个文件合计超过这个大小（MB）时按行哈希对比，计数超出预算时写入临时文件，默认 %(default)s")
+    parser.add_argument("--zone", action="append", default=list(ZONE_PATTERNS), metavar="PATTERN",
+                        help="文件名匹配该模式（如 '*.zone'、'db.*'）的文件按 zone 语义对比，可指定多次")
+    parser.add_argument("--json", action="store_true",
+                        help="边对比边以 JSON-lines 输出有差异的文件，最后一行为各类文件数")
+    parser.add_argument("-q", "--brief", action="store_true",
+                        help="遇到第一个差异即停止，不计算行差异；有差异时退出码为 1，用于发布前的检查")
+    parser.add_argument("--watch", action="store_true",
+                        help="对比一次后持续监视两个目录（inotify），只重新对比变化的文件，以 JSON-lines 输出差异变化")
+    parser.add_argument("--export-manifest", metavar="FILE",
+                        help="只计算 dir1 的清单并写入 FILE，可复制到其他主机后代替目录参与对比")
+    args = parser.parse_args()
+    workers = args.workers or os.cpu_count()
+
+    dir1, dir2 = args.dir1, args.dir2
+    if args.export_manifest:
+        if not os.path.isdir(dir1):
+            print(f"错误：目录 {dir1} 不存在")
+            sys.exit(1)
+        manifest = export_manifest(dir1, args.export_manifest, workers, args.manifest_dir, args.zone)
+        print(f"已导出 {len(manifest.entries)} 个文件的清单到 {args.export_manifest}")
+        return
+    if dir2 is None:
+        parser.error("需要指定 dir2")
+    for path in (dir1, dir2):
+        if not os.path.isdir(path) and not os.path.isfile(path):
+            print(f"错误：目录 {path} 不存在")
+            sys.exit(1)
+
+    if args.watch:
+        if not (os.path.isdir(dir1) and os.path.isdir(dir2)):
+            parser.error("--watch 只能用于两个目录")
+        try:
+            watch_directories(dir1, dir2, print_event, workers, args.manifest_dir, args.max_memory * 1024 * 1024,
+                              tuple(args.zone))
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.json or args.brief:
+        results = iter_compare(dir1, dir2, workers, args.manifest_dir, args.max_memory * 1024 * 1024,
+                               tuple(args.zone), details=not args.brief)
+        try:
+            differs = stream_results(results, print_event if args.json else print_brief, args.brief)
+        except ValueError as e:
+            print(f"错误：{e}")
+            sys.exit(1)
+        sys.exit(1 if differs and args.brief else 0)
+    try:
+        results = compare_directories(dir1, dir2, workers, args.manifest_dir, args.max_memory * 1024 * 1024,
+                                      tuple(args.zone))
+    except ValueError as e:
+        print(f"错误：{e}")
+        sys.exit(1)
+    print_results(results)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
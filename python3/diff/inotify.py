@@ -0,0 +1,175 @@
+"""
+用 ctypes 调用 Linux inotify，递归监视一组目录树，返回发生变化的文件和目录（相对各自根目录的路径）
+多个根目录共用一个 inotify 实例，同一相对路径在哪一侧变化都返回同一个路径，
+路径格式与 os.walk + os.path.relpath 相同（根目录下的文件为 "./name"）
+"""
+import os
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# 文件写完（close）、移入移出、新建和删除；不监视 IN_MODIFY，写入过程中不会反复触发
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+READ_SIZE = 64 * 1024
+MISSING_POLL = 1.0  # 根目录不存在时检查它是否重新出现的间隔（秒）
+
+_libc = None
+
+def _load_libc():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError(errno.ENOSYS, "当前系统不支持 inotify")
+        libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        libc.inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+        _libc = libc
+    return _libc
+
+def _check(result):
+    if result < 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return result
+
+class TreeWatcher:
+    """
+    递归监视 roots 中的各个目录树，新建或移入的子目录自动加入监视
+    read(timeout) 返回 (变化的文件集合, 变化的目录集合)；目录集合中的目录被删除、移走或新建，
+    其下的文件需要由调用者重新检查。事件队列溢出、根目录被删除或重新出现时返回 None，
+    调用者应调用 rewatch() 并全部重新对比
+    """
+
+    def __init__(self, roots):
+        self.libc = _load_libc()
+        self.fd = _check(self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.watches = {}  # wd -> (根目录, 相对路径)
+        self.missing = []  # 当前不存在的根目录
+        try:
+            self.rewatch()
+        except Exception:
+            self.close()
+            raise
+
+    def fileno(self):
+        return self.fd
+
+    def _add_watch(self, root, rel_dir):
+        path = os.path.normpath(os.path.join(root, rel_dir))
+        try:
+            wd = _check(self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK))
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return False  # 目录已经不存在
+            raise
+        self.watches[wd] = (root, rel_dir)
+        return True
+
+    def _add_tree(self, root, rel_dir, files=None):
+        """监视 rel_dir 及其子目录；files 不为 None 时把其中已有的文件加入 files"""
+        top = os.path.normpath(os.path.join(root, rel_dir))
+        if not self._add_watch(root, rel_dir):
+            return False
+        for dirpath, dirs, filenames in os.walk(top):
+            rel = os.path.relpath(dirpath, root)
+            if dirpath != top:
+                self._add_watch(root, rel)
+            dirs[:] = [d for d in dirs if not os.path.islink(os.path.join(dirpath, d))]
+            if files is not None:
+                files.update(os.path.join(rel, name) for name in filenames)
+        return True
+
+    def _remove_tree(self, root, rel_dir):
+        prefix = rel_dir + os.sep
+        for wd, (watch_root, rel) in list(self.watches.items()):
+            if watch_root == root and (rel == rel_dir or rel.startswith(prefix)):
+                del self.watches[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def rewatch(self):
+        """重新监视所有根目录（事件队列溢出或根目录被替换之后），已不存在的根目录跳过"""
+        for wd in list(self.watches):
+            self.libc.inotify_rm_watch(self.fd, wd)
+        self.watches = {}
+        self.missing = [root for root in self.roots if not self._add_tree(root, '.')]
+
+    def read(self, timeout=None):
+        """等待最多 timeout 秒（None 为一直等待），没有事件时返回两个空集合"""
+        files, dirs = set(), set()
+        if self.missing:
+            if any(os.path.isdir(root) for root in self.missing):
+                return None
+            timeout = MISSING_POLL if timeout is None else min(timeout, MISSING_POLL)
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return files, dirs
+        while True:
+            try:
+                data = os.read(self.fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+                name = data[offset + EVENT.size:offset + EVENT.size + length].rstrip(b'\0')
+                offset += EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    return None
+                watch = self.watches.get(wd)
+                if watch is None:
+                    continue
+                root, rel_dir = watch
+                if mask & IN_IGNORED:
+                    del self.watches[wd]
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    if rel_dir == '.':
+                        return None  # 根目录被删除或移走
+                    continue  # 子目录的变化由其父目录的事件处理
+                if not mask & IN_ISDIR:
+                    files.add(os.path.join(rel_dir, os.fsdecode(name)))
+                    continue
+                rel = os.path.normpath(os.path.join(rel_dir, os.fsdecode(name)))
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # 加入监视之前目录中可能已经有文件
+                    self._remove_tree(root, rel)
+                    self._add_tree(root, rel, files)
+                    dirs.add(rel)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_tree(root, rel)
+                    dirs.add(rel)
+        return files, dirs
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+            self.watches = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,113 @@
+"""zonefile 的解析和 diff_two_dirs 中 zone 文件无法解析时的退回；运行：python3 -m unittest test_zonefile"""
+import os
+import time
+import tempfile
+import unittest
+
+import zonefile
+import diff_two_dirs
+
+ZONE = """$ORIGIN example.com.
+$TTL 1h
+@   IN SOA ns1 hostmaster ( 2024010101 3600 900 1w 300 )
+    IN NS ns1
+www     A 192.0.2.1
+        A 192.0.2.2
+"""
+
+# 与 ZONE 语义相同：绝对名字、记录顺序不同、TTL 写为秒、serial 不同
+ZONE_REWRITTEN = """$TTL 3600
+www.example.com. A 192.0.2.2
+example.com. NS ns1.example.com.
+www.example.com. A 192.0.2.1
+example.com. SOA ns1.example.com. hostmaster.example.com. 2024020202 3600 900 604800 300
+"""
+
+class ZoneTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel, text):
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+class ParseTest(ZoneTestCase):
+    def test_semantically_equal_zones_have_same_digest(self):
+        a = self.write('a/example.com.zone', ZONE)
+        b = self.write('b/example.com.zone', ZONE_REWRITTEN)
+        self.assertEqual(zonefile.zone_digest(a), zonefile.zone_digest(b))
+        self.assertEqual(zonefile.compare_zone_files(a, b), (False, {}))
+
+    def test_directive_without_argument(self):
+        for directive in ('$ORIGIN', '$TTL', '$INCLUDE'):
+            with self.subTest(directive=directive):
+                path = self.write('bad.zone', f"{directive}\nwww A 192.0.2.1\n")
+                with self.assertRaises(zonefile.ZoneError):
+                    zonefile.zone_digest(path)
+
+    def test_include(self):
+        self.write('zones/common.inc', "www A 192.0.2.1\n")
+        path = self.write('zones/example.com.zone', "$ORIGIN example.com.\n$TTL 60\n$INCLUDE common.inc\n")
+        rrsets = zonefile.load_rrsets(path)
+        self.assertEqual(rrsets[('www.example.com.', 'A')].rdata, {'192.0.2.1'})
+
+    def test_missing_include(self):
+        path = self.write('example.com.zone', "$INCLUDE missing.inc\n")
+        with self.assertRaises(zonefile.ZoneError):
+            zonefile.zone_digest(path)
+
+    def test_include_outside_root(self):
+        self.write('common.inc', "www A 192.0.2.1\n")
+        path = self.write('tree/example.com.zone', "$INCLUDE ../common.inc\n")
+        with self.assertRaises(zonefile.ZoneError):
+            zonefile.zone_digest(path, root=os.path.join(self.root, 'tree'))
+        zonefile.zone_digest(path, root=self.root)
+
+    def test_ttl(self):
+        self.assertEqual(zonefile.parse_ttl('1w2d'), 9 * 86400)
+        self.assertEqual(zonefile.parse_ttl('1h30m'), 5400)
+        self.assertTrue(zonefile.is_ttl('300'))
+        self.assertFalse(zonefile.is_ttl('A'))
+        start = time.monotonic()
+        self.assertFalse(zonefile.is_ttl('1' * 5000 + 'x'))
+        self.assertLess(time.monotonic() - start, 1)
+
+class FallbackTest(ZoneTestCase):
+    """无法按 zone 文件解析时按行对比，不中断整个对比，也不报告为无法读取"""
+
+    def compare(self):
+        dir1, dir2 = os.path.join(self.root, 'a'), os.path.join(self.root, 'b')
+        results = list(diff_two_dirs.iter_compare(dir1, dir2, zone_patterns=('*.zone',)))
+        return {rel: (status, diff) for status, rel, diff in results}
+
+    def test_malformed_zone(self):
+        self.write('a/example.com.zone', "$ORIGIN\n")
+        self.write('b/example.com.zone', "$ORIGIN\nwww A 192.0.2.1\n")
+        status, diff = self.compare()[os.path.join('.', 'example.com.zone')]
+        self.assertEqual(status, 'modified')
+        self.assertEqual(list(diff['dir2_only']), [b'www A 192.0.2.1'])
+
+    def test_missing_include(self):
+        self.write('a/example.com.zone', "$INCLUDE missing.inc\n")
+        self.write('b/example.com.zone', "$INCLUDE missing.inc\nwww A 192.0.2.1\n")
+        status, diff = self.compare()[os.path.join('.', 'example.com.zone')]
+        self.assertEqual(status, 'modified')
+        self.assertIn('dir2_only', diff)
+
+    def test_semantic_compare(self):
+        self.write('a/example.com.zone', ZONE)
+        self.write('b/example.com.zone', ZONE_REWRITTEN + "ftp.example.com. A 192.0.2.9\n")
+        status, diff = self.compare()[os.path.join('.', 'example.com.zone')]
+        self.assertEqual(status, 'modified')
+        self.assertEqual(diff['zone'], {'ftp.example.com.': {'added': ['3600 A 192.0.2.9'], 'removed': [],
+                                                             'changed': []}})
+
+if __name__ == '__main__':
+    unittest.main()
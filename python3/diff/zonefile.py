@@ -0,0 +1,242 @@
+"""
+zone 文件的语义对比：流式解析 zone 文件（$ORIGIN、$TTL、$INCLUDE、相对名字、省略的 owner、
+括号跨行、注释、TTL 单位），把每条记录规范化后按 (owner, 类型) 归入 RRset，
+两个文件按 RRset 的哈希逐个比较，输出每个名字下新增、删除和变化的记录
+
+规范化：owner 和 rdata 中的域名统一为小写的绝对名（带末尾的点），类型和类大写，
+TTL 换算为秒，AAAA 统一为压缩格式；SOA 的 serial 和 version TXT 中的 UUID 按 IGNORE_* 忽略
+"""
+import os
+import re
+import hashlib
+import ipaddress
+
+IGNORE_SOA_SERIAL = True   # 对比时忽略 SOA 的 serial
+IGNORE_VERSION_UUID = True  # 忽略 owner 为 version.* 且内容为 UUID 的 TXT 记录
+DEFAULT_ORIGIN = '.'       # 文件中没有 $ORIGIN 时相对名字的后缀（两侧相同即可对比）
+MAX_INCLUDE_DEPTH = 8
+
+CLASSES = {'IN', 'CH', 'HS', 'CS', 'ANY'}
+TTL_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+TTL_PATTERN = re.compile(r'^(?:\d+[smhdw])*\d+[smhdw]?$', re.IGNORECASE)
+UUID_RDATA = re.compile(r'^"?[0-9a-f]{8}-([0-9a-f]{4}-){3}[0-9a-f]{12}"?$', re.IGNORECASE)
+
+# 各类型 rdata 中是域名的字段位置
+NAME_FIELDS = {
+    'NS': (0,), 'CNAME': (0,), 'PTR': (0,), 'DNAME': (0,),
+    'MX': (1,), 'KX': (1,), 'AFSDB': (1,), 'RT': (1,),
+    'SRV': (3,), 'SOA': (0, 1), 'RP': (0, 1), 'MINFO': (0, 1),
+}
+
+class ZoneError(Exception):
+    """无法按 zone 文件解析"""
+
+def parse_ttl(token):
+    """BIND 风格的 TTL：纯数字或 1h30m 这样的带单位写法，返回秒数"""
+    if token.isdigit():
+        return int(token)
+    if not TTL_PATTERN.match(token):
+        raise ZoneError(f"无效的 TTL: {token}")
+    total = 0
+    for number, unit in re.findall(r'(\d+)([smhdw]?)', token.lower()):
+        total += int(number) * TTL_UNITS.get(unit or 's')
+    return total
+
+def is_ttl(token):
+    return token.isdigit() or bool(TTL_PATTERN.match(token))
+
+def absolute_name(name, origin):
+    """相对名字加上 origin，@ 为 origin 本身，统一为小写带末尾的点"""
+    if name == '@':
+        return origin
+    name = name.lower()
+    if name.endswith('.'):
+        return name
+    return name + '.' + origin if origin != '.' else name + '.'
+
+def tokenize(lines):
+    """
+    把物理行合并为逻辑记录：处理引号、注释和括号跨行
+    依次返回 (tokens, owner 是否省略)；owner 省略指记录行以空白开头
+    """
+    tokens, blank_owner, depth = [], False, 0
+    for line in lines:
+        if depth == 0:
+            tokens, blank_owner = [], line[:1] in (' ', '\t')
+        i, n = 0, len(line)
+        while i < n:
+            c = line[i]
+            if c in ' \t\r\n':
+                i += 1
+            elif c == ';':
+                break
+            elif c == '(':
+                depth += 1
+                i += 1
+            elif c == ')':
+                if depth == 0:
+                    raise ZoneError("括号不匹配")
+                depth -= 1
+                i += 1
+            elif c == '"':
+                j = i + 1
+                while j < n and line[j] != '"':
+                    j += 2 if line[j] == '\\' else 1
+                if j >= n:
+                    raise ZoneError("引号不匹配")
+                tokens.append(line[i:j + 1])
+                i = j + 1
+            else:
+                j = i
+                while j < n and line[j] not in ' \t\r\n;()"':
+                    j += 2 if line[j] == '\\' else 1
+                tokens.append(line[i:j])
+                i = j
+        if depth == 0 and tokens:
+            yield tokens, blank_owner
+    if depth != 0:
+        raise ZoneError("括号未闭合")
+
+def canonical_rdata(rtype, rdata, origin):
+    fields = list(rdata)
+    for i in NAME_FIELDS.get(rtype, ()):
+        if i < len(fields):
+            fields[i] = absolute_name(fields[i], origin)
+    if rtype == 'SOA' and len(fields) == 7:
+        fields[2:] = [str(parse_ttl(f)) for f in fields[2:]]
+        if IGNORE_SOA_SERIAL:
+            fields[2] = '0'
+    elif rtype == 'AAAA' and len(fields) == 1:
+        try:
+            fields[0] = ipaddress.IPv6Address(fields[0]).compressed
+        except ValueError:
+            pass
+    return ' '.join(fields)
+
+def _include_path(path, target, root):
+    """$INCLUDE 的文件（相对当前文件所在目录），不能位于 root 之外"""
+    include = os.path.realpath(os.path.join(os.path.dirname(path), target))
+    root = os.path.realpath(root)
+    if os.path.commonpath([include, root]) != root:
+        raise ZoneError(f"$INCLUDE 的文件不在对比的目录中: {target}")
+    return include
+
+def iter_records(path, origin=DEFAULT_ORIGIN, root=None, depth=0):
+    """
+    流式解析 zone 文件，依次返回规范化的记录 (owner, 类型, TTL, rdata)；类为 IN 以外时类型前加上类
+    root 为对比的目录树的根（默认为文件所在目录），$INCLUDE 的文件不能位于其外，
+    包含的文件不存在或无法读取时与格式错误一样抛出 ZoneError
+    """
+    if depth > MAX_INCLUDE_DEPTH:
+        raise ZoneError("$INCLUDE 嵌套过深")
+    root = root or os.path.dirname(os.path.abspath(path))
+    origin = absolute_name(origin, '.')
+    default_ttl = last_ttl = None
+    owner = origin
+    with open(path, 'r', encoding='utf-8') as f:
+        for tokens, blank_owner in tokenize(f):
+            head = tokens[0].upper()
+            if head in ('$ORIGIN', '$TTL', '$INCLUDE') and len(tokens) < 2:
+                raise ZoneError(f"{head} 缺少参数")
+            if head == '$ORIGIN':
+                origin = absolute_name(tokens[1], origin)
+                continue
+            if head == '$TTL':
+                default_ttl = parse_ttl(tokens[1])
+                continue
+            if head == '$INCLUDE':
+                include = _include_path(path, tokens[1], root)
+                try:
+                    yield from iter_records(include, tokens[2] if len(tokens) > 2 else origin, root, depth + 1)
+                except OSError as e:
+                    raise ZoneError(f"无法读取 $INCLUDE 的文件 {tokens[1]}: {e}") from e
+                continue
+            if head.startswith('$'):
+                # $GENERATE 等不展开，整行作为一条记录参与对比
+                yield head, 'DIRECTIVE', 0, ' '.join(tokens[1:])
+                continue
+
+            rest = tokens if blank_owner else tokens[1:]
+            if not blank_owner:
+                owner = absolute_name(tokens[0], origin)
+            ttl, rclass = None, 'IN'
+            while rest and (is_ttl(rest[0]) or rest[0].upper() in CLASSES):
+                if rest[0].upper() in CLASSES:
+                    rclass = rest[0].upper()
+                else:
+                    ttl = parse_ttl(rest[0])
+                rest = rest[1:]
+            if not rest:
+                raise ZoneError(f"缺少记录类型: {' '.join(tokens)}")
+            rtype = rest[0].upper()
+            if ttl is None:
+                ttl = default_ttl if default_ttl is not None else last_ttl
+            if ttl is None and rtype == 'SOA' and len(rest) == 8:
+                ttl = parse_ttl(rest[7])
+            last_ttl = ttl
+            rdata = canonical_rdata(rtype, rest[1:], origin)
+            if (IGNORE_VERSION_UUID and rtype == 'TXT' and owner.startswith('version.')
+                    and UUID_RDATA.match(rdata)):
+                continue
+            yield owner, rtype if rclass == 'IN' else f"{rclass} {rtype}", ttl or 0, rdata
+
+class RRset:
+    __slots__ = ('ttl', 'rdata')
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.rdata = set()
+
+    def digest(self):
+        hasher = hashlib.md5(str(self.ttl).encode())
+        for rdata in sorted(self.rdata):
+            hasher.update(b'\0' + rdata.encode('utf-8'))
+        return hasher.digest()
+
+def load_rrsets(path, origin=DEFAULT_ORIGIN, root=None):
+    """解析 zone 文件，返回 {(owner, 类型): RRset}；同一 RRset 中 TTL 不同时取最小值"""
+    rrsets = {}
+    for owner, rtype, ttl, rdata in iter_records(path, origin, root):
+        rrset = rrsets.get((owner, rtype))
+        if rrset is None:
+            rrset = rrsets[(owner, rtype)] = RRset(ttl)
+        rrset.ttl = min(rrset.ttl, ttl)
+        rrset.rdata.add(rdata)
+    return rrsets
+
+def zone_digest(path, origin=DEFAULT_ORIGIN, root=None):
+    """zone 文件的语义特征值：与记录顺序、写法（相对/绝对名字、括号、空白）无关"""
+    hasher = hashlib.md5()
+    for key, rrset in sorted(load_rrsets(path, origin, root).items()):
+        hasher.update('\0'.join(key).encode('utf-8') + rrset.digest())
+    return hasher.hexdigest()
+
+def diff_rrsets(rrsets1, rrsets2):
+    """
+    按 RRset 对比，返回 {owner: {'added': [...], 'removed': [...], 'changed': [...]}}，没有差异时返回空字典
+    added / removed 为 "TTL 类型 rdata" 形式的记录，changed 为 TTL 变化的 RRset："类型 TTL 旧值 -> 新值"
+    """
+    names = {}
+
+    def entry(owner):
+        return names.setdefault(owner, {'added': [], 'removed': [], 'changed': []})
+
+    for key in rrsets1.keys() | rrsets2.keys():
+        owner, rtype = key
+        old, new = rrsets1.get(key), rrsets2.get(key)
+        if old is not None and new is not None and old.digest() == new.digest():
+            continue
+        old_rdata = old.rdata if old is not None else set()
+        new_rdata = new.rdata if new is not None else set()
+        for rdata in sorted(new_rdata - old_rdata):
+            entry(owner)['added'].append(f"{new.ttl} {rtype} {rdata}")
+        for rdata in sorted(old_rdata - new_rdata):
+            entry(owner)['removed'].append(f"{old.ttl} {rtype} {rdata}")
+        if old is not None and new is not None and old.ttl != new.ttl and old_rdata & new_rdata:
+            entry(owner)['changed'].append(f"{rtype} TTL {old.ttl} -> {new.ttl}")
+    return {owner: names[owner] for owner in sorted(names)}
+
+def compare_zone_files(file1, file2, origin=DEFAULT_ORIGIN, root1=None, root2=None):
+    """返回 (是否有差异, 按名字的差异字典)；root1 / root2 为两个文件所在的目录树的根，见 iter_records"""
+    diff = diff_rrsets(load_rrsets(file1, origin, root1), load_rrsets(file2, origin, root2))
+    return bool(diff), diff
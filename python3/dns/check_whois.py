@@ -1,64 +1,153 @@
-import whois
 import logging
-import time
-from datetime import datetime
+import argparse
+import nsstore
+import whoisquery
 
-# 配置日志
-logging.basicConfig(
-    filename='dns-whois.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+try:
+    import whois
+except ImportError:
+    whois = None
 
-def get_name_servers(domain):
-    """查询域名并返回名称服务器列表"""
+WHOIS_FILE = 'dns-whois.txt'
+LOG_FILE = 'dns-whois.log'
+WORKERS = whoisquery.WORKERS  # 同时在途的 whois 查询数，每台 whois 服务器的限速见 whoisquery.SERVER_RATES
+USE_WHOIS_PACKAGE = False     # 为 True 时改用 whois 包查询，限速、退避和重试仍由 whoisquery 负责
+STATE_DB = 'dns-whois.db'     # 各域名上次的 NS 列表，设为 None 关闭（每次全部查询、全部记录）
+REFRESH_AGE = 86400           # NS 列表的复用时间（秒），到期后重新查询
+ERROR_REFRESH_AGE = 600       # 上次查询出错的域名的重查间隔（秒）
+CHANGED_REFRESH_AGE = 3600    # 最近 CHANGED_WINDOW 秒内 NS 有变化的域名的重查间隔（秒）
+CHANGED_WINDOW = 7 * 86400
+
+def setup_logging():
+    # 配置日志
+    logging.basicConfig(
+        filename=LOG_FILE,
+        level=logging.INFO,
+        format='%(asctime)s - %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+
+def read_domains(path=WHOIS_FILE):
+    with open(path, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+def package_lookup(server, domain):
+    """用 whois 包查询（由包自己选择服务器），与 whoisquery.lookup 接口相同"""
     try:
         w = whois.whois(domain)
-        # 处理不同格式的返回结果
-        if isinstance(w.name_servers, list):
-            return [ns.lower() for ns in w.name_servers if ns]
-        elif w.name_servers:
-            return [ns.strip().lower() for ns in w.name_servers.split(',') if ns.strip()]
-        return []
     except Exception as e:
-        logging.error(f"Domain: {domain}, Error: {str(e)}")
+        raise whoisquery.WhoisError(str(e)) from e
+    # 处理不同格式的返回结果
+    if isinstance(w.name_servers, list):
+        return [ns.lower() for ns in w.name_servers if ns]
+    elif w.name_servers:
+        return [ns.strip().lower() for ns in w.name_servers.split(',') if ns.strip()]
+    return []
+
+def collect(domains, limits=None):
+    """并发查询，返回 {域名: NS 列表 或 WhoisError}"""
+    lookup = package_lookup if USE_WHOIS_PACKAGE and whois is not None else whoisquery.lookup
+    return whoisquery.collect(domains, limits, WORKERS, lookup=lookup)
+
+def log_result(domain, result):
+    """记录一个域名的查询结果，返回 NS 列表，出错时返回 None"""
+    if isinstance(result, Exception):
+        logging.error(f"Domain: {domain}, Error: {str(result)}")
+        return None
+    if result:
+        ns_list = ', '.join(sorted(set(result)))
+        logging.info(f"Domain: {domain}, Name Servers: {ns_list}")
+    else:
+        logging.info(f"Domain: {domain}, No name servers found")
+    return result
+
+def normalize(name_servers):
+    """NS 列表统一为小写、不带末尾的点、去重并排序"""
+    return sorted({ns.strip().rstrip('.').lower() for ns in name_servers if ns and ns.strip()})
+
+def open_store(path=STATE_DB):
+    return nsstore.StateStore(path) if path else None
+
+def record_result(store, domain, result):
+    """与上次的 NS 列表对比，只记录首次出现、发生变化和出错的域名，返回 NS 列表，出错时返回 None"""
+    if isinstance(result, Exception):
+        store.save_whois_error(domain, str(result))
+        logging.error(f"Domain: {domain}, Error: {str(result)}")
         return None
+    name_servers = normalize(result)
+    previous = store.save_whois(domain, name_servers)
+    if previous is None:
+        log_result(domain, name_servers)
+    elif previous != name_servers:
+        logging.info(f"Domain: {domain}, Name Servers changed: {', '.join(name_servers) or '(none)'} "
+                     f"(previously: {', '.join(previous) or '(none)'})")
+    return name_servers
+
+def get_name_servers(domain):
+    """查询域名并返回名称服务器列表，出错时记录错误并返回 None"""
+    result = collect([domain])[domain]
+    if isinstance(result, Exception):
+        logging.error(f"Domain: {domain}, Error: {str(result)}")
+        return None
+    return result
+
+def check_domains(domains, limits=None, store=None, force=False):
+    """
+    并发查询并按列表顺序记录一批域名的 NS，返回 {域名: NS 列表 或 None（出错）}
+    limits 为 whoisquery.RateLimits，常驻进程在各轮之间传入同一个实例以保留限速和退避状态
+    有 store 时未到重查时间的域名直接返回上次的结果（force 为真时全部重查），
+    日志只记录 NS 首次出现、发生变化和出错的域名；没有 store 时每个域名都查询并记录
+    """
+    domains = list(dict.fromkeys(domains))
+    cached = {}
+    if store is not None and not force:
+        cached = store.fresh_whois(domains, REFRESH_AGE, ERROR_REFRESH_AGE, CHANGED_REFRESH_AGE, CHANGED_WINDOW)
+    results = collect([domain for domain in domains if domain not in cached], limits)
+    checked = {}
+    for domain in domains:
+        if domain in cached:
+            checked[domain] = cached[domain]
+        elif store is None:
+            checked[domain] = log_result(domain, results[domain])
+        else:
+            checked[domain] = record_result(store, domain, results[domain])
+    if store is not None:
+        store.commit()
+    return checked
+
+def check_domain(domain, limits=None, store=None):
+    """查询并记录一个域名的 NS，返回 NS 列表，出错时返回 None"""
+    return check_domains([domain], limits, store)[domain]
 
 # 主处理流程
-try:
-    with open('dns-whois.txt', 'r') as file:
-        domains = [line.strip() for line in file if line.strip()]
-
-    total = len(domains)
-    for i, domain in enumerate(domains, 1):
-        if not domain:
-            continue
-
-        start_time = datetime.now()
-        logging.info(f"Processing {i}/{total}: {domain}")
-        #print(f"[{start_time.strftime('%H:%M:%S')}] Processing {i}/{total}: {domain}")
-
-        name_servers = get_name_servers(domain)
-
-        if name_servers is None:
-            continue  # 已记录错误
-        elif name_servers:
-            ns_list = ', '.join(sorted(set(name_servers)))
-            logging.info(f"Domain: {domain}, Name Servers: {ns_list}")
-            #print(f"  Found {len(name_servers)} name servers")
+def main():
+    parser = argparse.ArgumentParser(description="查询域名注册的 NS，记录变化")
+    parser.add_argument("--force", action="store_true", help="忽略缓存，全部重新查询")
+    args = parser.parse_args()
+    setup_logging()
+    store = open_store()
+    try:
+        domains = read_domains()
+        if store is None:
+            results = collect(domains)
+            total = len(domains)
+            for i, domain in enumerate(domains, 1):
+                logging.info(f"Processing {i}/{total}: {domain}")
+                log_result(domain, results[domain])
         else:
-            logging.info(f"Domain: {domain}, No name servers found")
-            #print("  No name servers found")
-
-        # 避免请求过快的延迟
-        elapsed = (datetime.now() - start_time).total_seconds()
-        if elapsed < 1.5:
-            time.sleep(1.5 - elapsed)
-
-except FileNotFoundError:
-    logging.error("Error: dns-whois.txt file not found")
-    #print("Error: dns-whois.txt file not found")
-except Exception as e:
-    logging.error(f"Unexpected error: {str(e)}")
-    #print(f"Unexpected error: {str(e)}")
\ No newline at end of file
+            checked = check_domains(domains, store=store, force=args.force)
+            errors = sum(name_servers is None for name_servers in checked.values())
+            logging.info(f"Done: {len(checked)} domains, {errors} errors")
+
+    except FileNotFoundError:
+        logging.error("Error: dns-whois.txt file not found")
+        #print("Error: dns-whois.txt file not found")
+    except Exception as e:
+        logging.error(f"Unexpected error: {str(e)}")
+        #print(f"Unexpected error: {str(e)}")
+    finally:
+        if store is not None:
+            store.close()
+
+if __name__ == "__main__":
+    main()
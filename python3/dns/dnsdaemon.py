@@ -0,0 +1,215 @@
+"""
+常驻进程模式：一个进程内持续运行 NS / NS-IP / whois 检查，替代三个 cron 任务
+
+- 每个域名按各自的间隔调度，并加入随机抖动，避免所有域名同时到期
+- 上次检查不一致或出错的域名按更短的间隔重查
+- dns-ns.txt / dns-ip.txt / dns-whois.txt / dns-rules.json 修改后自动重新加载
+- 委派缓存、状态库连接、线程池在各轮之间共享
+- 与 cron 运行的 nscheck.py 共用进程锁，不会重叠运行
+- 设置 METRICS_PORT 后在本地 http://127.0.0.1:METRICS_PORT/metrics 提供检查指标
+
+运行：
+    nohup python3 dnsdaemon.py >log_dnsdaemon.out 2>&1 &
+"""
+import os
+import heapq
+import random
+import signal
+import threading
+import time
+import logging
+import nscheck
+import nsmetrics
+
+CHECK_INTERVAL = 180   # NS / NS-IP 检查的正常间隔（秒）
+RETRY_INTERVAL = 60    # 不一致或出错的域名的重查间隔（秒）
+WHOIS_INTERVAL = 180   # whois 检查的正常间隔（秒）
+WHOIS_RETRY_INTERVAL = 60
+JITTER = 0.1           # 间隔的随机抖动比例
+POLL_INTERVAL = 1.0    # 检查文件变化和到期任务的最长等待时间（秒）
+BATCH_WINDOW = 2.0     # 相近时间到期的域名合并为一批检查（秒）
+METRICS_PORT = None    # 本地 HTTP /metrics 端口，None 为不提供（textfile 见 nscheck.METRICS_FILE）
+
+class Scheduler:
+    """按域名维护下一次检查时间的小顶堆，已移除或重新调度的旧条目惰性丢弃"""
+
+    def __init__(self, interval, retry_interval, jitter=JITTER):
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.jitter = jitter
+        self.heap = []
+        self.next_due = {}
+
+    def _push(self, domain, due):
+        self.next_due[domain] = due
+        heapq.heappush(self.heap, (due, domain))
+
+    def _jittered(self, interval):
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def sync(self, domains, now=None):
+        """与最新的域名列表同步：新域名在一个间隔内随机分散到期，已删除的域名不再调度"""
+        now = time.monotonic() if now is None else now
+        domains = set(domains)
+        for domain in domains - set(self.next_due):
+            self._push(domain, now + random.uniform(0, self.interval * self.jitter))
+        for domain in set(self.next_due) - domains:
+            del self.next_due[domain]
+
+    def pop_due(self, now=None, window=0):
+        """取出 now + window 之前到期的域名"""
+        now = time.monotonic() if now is None else now
+        due = []
+        while self.heap and self.heap[0][0] <= now + window:
+            when, domain = heapq.heappop(self.heap)
+            if self.next_due.get(domain) == when:
+                del self.next_due[domain]
+                due.append(domain)
+        return due
+
+    def reschedule(self, domain, failed, now=None):
+        now = time.monotonic() if now is None else now
+        interval = self.retry_interval if failed else self.interval
+        self._push(domain, now + self._jittered(interval))
+
+    def wait_time(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self.heap and self.next_due.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        if not self.heap:
+            return POLL_INTERVAL
+        return max(0.0, min(POLL_INTERVAL, self.heap[0][0] - now))
+
+class WatchedFile:
+    """按修改时间检测文件变化"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+
+    def changed(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self.mtime:
+            self.mtime = mtime
+            return True
+        return False
+
+def read_optional(path):
+    try:
+        return nscheck.read_domains(path)
+    except FileNotFoundError:
+        return []
+
+class DnsLoop:
+    """NS / NS-IP 检查循环"""
+
+    def __init__(self, stop_event):
+        self.stop_event = stop_event
+        self.checker = nscheck.Checker()
+        self.scheduler = Scheduler(CHECK_INTERVAL, RETRY_INTERVAL)
+        self.ns_file = WatchedFile(nscheck.NS_DNS_FILE)
+        self.ip_file = WatchedFile(nscheck.IP_DNS_FILE)
+        self.rules_file = WatchedFile(nscheck.RULES_FILE)
+        self.ns_domains = []
+        self.ip_domains = []
+
+    def reload(self):
+        ns_changed = self.ns_file.changed()
+        ip_changed = self.ip_file.changed()
+        if ns_changed or ip_changed:
+            self.ns_domains = read_optional(nscheck.NS_DNS_FILE)
+            self.ip_domains = read_optional(nscheck.IP_DNS_FILE)
+            self.scheduler.sync(self.ns_domains + self.ip_domains)
+            self.checker.logger.info(
+                f"🔄 重新加载域名列表: NS {len(self.ns_domains)} 个, IP {len(self.ip_domains)} 个")
+        if self.rules_file.changed():
+            self.checker.reload_rules()
+
+    def run_once(self):
+        self.reload()
+        due = set(self.scheduler.pop_due(window=BATCH_WINDOW))
+        if due:
+            # 按文件中的顺序组织本批域名，保证日志顺序稳定
+            ns_batch = [d for d in self.ns_domains if d in due]
+            ip_batch = [d for d in self.ip_domains if d in due]
+            inconsistent = self.checker.check(ns_batch, ip_batch)
+            for domain in due:
+                self.scheduler.reschedule(domain, domain in inconsistent)
+        self.stop_event.wait(self.scheduler.wait_time())
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                self.run_once()
+        finally:
+            self.checker.close()
+
+class WhoisLoop:
+    """whois 检查循环，单独线程运行，不阻塞 DNS 检查；到期的域名按批并发查询"""
+
+    def __init__(self, stop_event, check_whois):
+        self.stop_event = stop_event
+        self.check_whois = check_whois
+        self.scheduler = Scheduler(WHOIS_INTERVAL, WHOIS_RETRY_INTERVAL)
+        self.whois_file = WatchedFile(check_whois.WHOIS_FILE)
+        # 各 whois 服务器的限速和退避状态在各批之间保留
+        self.limits = check_whois.whoisquery.RateLimits()
+
+    def run(self):
+        self.check_whois.setup_logging()
+        store = self.check_whois.open_store()
+        try:
+            self._loop(store)
+        finally:
+            if store is not None:
+                store.close()
+
+    def _loop(self, store):
+        while not self.stop_event.is_set():
+            if self.whois_file.changed():
+                domains = read_optional(self.check_whois.WHOIS_FILE)
+                self.scheduler.sync(domains)
+                logging.info(f"Reloaded {self.check_whois.WHOIS_FILE}: {len(domains)} domains")
+            due = self.scheduler.pop_due(window=BATCH_WINDOW)
+            if due:
+                results = self.check_whois.check_domains(due, self.limits, store)
+                for domain, name_servers in results.items():
+                    self.scheduler.reschedule(domain, name_servers is None)
+            self.stop_event.wait(self.scheduler.wait_time())
+
+def main():
+    lock = nscheck.acquire_lock()
+    if lock is None:
+        print(f"另一个检查进程正在运行（{', '.join(nscheck.lock_files())}），退出")
+        return
+
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+
+    metrics_server = None
+    if METRICS_PORT:
+        metrics_server = nsmetrics.serve(METRICS_PORT)
+
+    threads = []
+    try:
+        import check_whois
+    except ImportError as e:
+        print(f"whois 模块不可用，跳过 whois 检查: {e}")
+    else:
+        threads.append(threading.Thread(target=WhoisLoop(stop_event, check_whois).run, daemon=True))
+    for thread in threads:
+        thread.start()
+
+    with lock:
+        DnsLoop(stop_event).run()
+        for thread in threads:
+            thread.join(timeout=5)
+    if metrics_server is not None:
+        metrics_server.shutdown()
+
+if __name__ == "__main__":
+    main()
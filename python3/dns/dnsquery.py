@@ -0,0 +1,642 @@
+import socket
+import struct
+import random
+import time
+import ipaddress
+import threading
+import contextvars
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DNS_PORT = 53
+QUERY_TIMEOUT = 3       # 单次发送等待应答的超时（秒）
+QUERY_RETRIES = 2       # UDP 超时后的重试次数
+EDNS_UDP_SIZE = 1232    # EDNS0 通告的 UDP 负载大小
+MAX_TRACE_DEPTH = 16    # trace 最多跟随的委派层数
+SERVER_CONCURRENCY = 8  # 每台目标服务器同时在途的查询数上限
+HEDGE_DELAY = 0.3       # 对冲查询：在途的查询这么久（秒）还没有应答时，向下一台服务器再发一次
+FANOUT_WORKERS = 64     # 对冲和并发扇出查询共用的线程数
+
+# 每次查询结束后依次调用 observer(server, qtype, 耗时秒数, 异常或 None)，用于统计延迟和错误
+QUERY_OBSERVERS = []
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_PTR = 12
+TYPE_MX = 15
+TYPE_TXT = 16
+TYPE_AAAA = 28
+TYPE_OPT = 41
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+# 根服务器 IPv4 地址（root hints）
+ROOT_SERVERS = {
+    "a.root-servers.net": "198.41.0.4",
+    "b.root-servers.net": "170.247.170.2",
+    "c.root-servers.net": "192.33.4.12",
+    "d.root-servers.net": "199.7.91.13",
+    "e.root-servers.net": "192.203.230.10",
+    "f.root-servers.net": "192.5.5.241",
+    "g.root-servers.net": "192.112.36.4",
+    "h.root-servers.net": "198.97.190.53",
+    "i.root-servers.net": "192.36.148.17",
+    "j.root-servers.net": "192.58.128.30",
+    "k.root-servers.net": "193.0.14.129",
+    "l.root-servers.net": "199.7.83.42",
+    "m.root-servers.net": "202.12.27.33",
+}
+
+Record = namedtuple("Record", "name type ttl data")
+Hop = namedtuple("Hop", "zone server address response")
+
+class DNSError(Exception):
+    """DNS 查询失败"""
+
+class DNSTimeout(DNSError):
+    """重试用尽仍未收到应答"""
+
+class Response:
+    """解析后的 DNS 应答，记录名统一为小写且不带末尾的点"""
+
+    def __init__(self, qid, flags, question, answer, authority, additional, edns_size=None):
+        self.id = qid
+        self.flags = flags
+        self.question = question
+        self.answer = answer
+        self.authority = authority
+        self.additional = additional
+        self.edns_size = edns_size
+        self.server = None
+        self.tcp = False
+
+    @property
+    def rcode(self):
+        return self.flags & 0x000f
+
+    @property
+    def aa(self):
+        return bool(self.flags & 0x0400)
+
+    @property
+    def tc(self):
+        return bool(self.flags & 0x0200)
+
+    def records(self):
+        return self.answer + self.authority + self.additional
+
+    def ns_names(self):
+        """应答中出现的所有 NS 记录指向的主机名（与 dig 输出中提取 NS 的方式一致）"""
+        return {r.data for r in self.answer + self.authority if r.type == TYPE_NS}
+
+    def addresses(self, name, rtypes=(TYPE_A,)):
+        """应答中（含附加段 glue）指定主机名的地址"""
+        name = normalize_name(name)
+        return {r.data for r in self.records() if r.name == name and r.type in rtypes}
+
+    def referral(self):
+        """如果是委派应答，返回 (被委派的 zone, NS 主机名集合)，否则返回 None"""
+        if self.answer or self.aa or self.rcode != RCODE_NOERROR:
+            return None
+        ns_records = [r for r in self.authority if r.type == TYPE_NS]
+        if not ns_records:
+            return None
+        zone = ns_records[0].name
+        return zone, {r.data for r in ns_records if r.name == zone}
+
+def normalize_name(name):
+    return name.rstrip(".").lower()
+
+def encode_name(name):
+    name = normalize_name(name)
+    if not name:
+        return b"\x00"
+    out = bytearray()
+    for label in name.split("."):
+        raw = label.encode("idna") if not label.isascii() else label.encode("ascii")
+        if not raw or len(raw) > 63:
+            raise DNSError(f"非法域名: {name}")
+        out.append(len(raw))
+        out += raw
+    out.append(0)
+    return bytes(out)
+
+def build_query(qname, qtype, qid=None, recursive=True, edns=True):
+    """构造查询报文，返回 (报文, 查询 ID)"""
+    qid = random.getrandbits(16) if qid is None else qid
+    flags = 0x0100 if recursive else 0
+    header = struct.pack("!HHHHHH", qid, flags, 1, 0, 0, 1 if edns else 0)
+    message = header + encode_name(qname) + struct.pack("!HH", qtype, CLASS_IN)
+    if edns:
+        # OPT 伪记录：根名称、类型 41、class 字段为 UDP 负载大小
+        message += b"\x00" + struct.pack("!HHIH", TYPE_OPT, EDNS_UDP_SIZE, 0, 0)
+    return message, qid
+
+def _read_name(data, offset):
+    labels = []
+    jumped = False
+    end = offset
+    for _ in range(128):
+        if offset >= len(data):
+            raise DNSError("报文截断")
+        length = data[offset]
+        if length & 0xc0 == 0xc0:
+            # 压缩指针
+            if offset + 1 >= len(data):
+                raise DNSError("报文截断")
+            if not jumped:
+                end = offset + 2
+            offset = ((length & 0x3f) << 8) | data[offset + 1]
+            jumped = True
+            continue
+        if length == 0:
+            if not jumped:
+                end = offset + 1
+            return ".".join(labels).lower(), end
+        offset += 1
+        if offset + length > len(data):
+            raise DNSError("报文截断")
+        labels.append(data[offset:offset + length].decode("ascii", "replace"))
+        offset += length
+    raise DNSError("压缩指针循环")
+
+def _parse_rdata(data, offset, rtype, rdlength):
+    rdata = data[offset:offset + rdlength]
+    if rtype == TYPE_A and rdlength == 4:
+        return socket.inet_ntop(socket.AF_INET, rdata)
+    if rtype == TYPE_AAAA and rdlength == 16:
+        return socket.inet_ntop(socket.AF_INET6, rdata)
+    if rtype in (TYPE_NS, TYPE_CNAME, TYPE_PTR):
+        return _read_name(data, offset)[0]
+    if rtype == TYPE_MX:
+        if rdlength < 3:
+            raise DNSError("MX 记录截断")
+        return struct.unpack("!H", rdata[:2])[0], _read_name(data, offset + 2)[0]
+    if rtype == TYPE_SOA:
+        mname, pos = _read_name(data, offset)
+        rname, pos = _read_name(data, pos)
+        if pos + 20 > len(data):
+            raise DNSError("SOA 记录截断")
+        return (mname, rname) + struct.unpack("!IIIII", data[pos:pos + 20])
+    if rtype == TYPE_TXT:
+        strings, pos = [], 0
+        while pos < len(rdata):
+            strings.append(rdata[pos + 1:pos + 1 + rdata[pos]].decode("utf-8", "replace"))
+            pos += 1 + rdata[pos]
+        return tuple(strings)
+    return rdata
+
+def parse_message(data):
+    """解析应答报文，返回 Response；报文截断或格式错误时抛出 DNSError（调用者丢弃该报文）"""
+    try:
+        return _parse_message(data)
+    except (struct.error, IndexError, ValueError) as e:
+        raise DNSError(f"报文格式错误: {e}") from e
+
+def _parse_message(data):
+    if len(data) < 12:
+        raise DNSError("报文过短")
+    qid, flags, qdcount, ancount, nscount, arcount = struct.unpack("!HHHHHH", data[:12])
+    offset = 12
+    question = []
+    for _ in range(qdcount):
+        name, offset = _read_name(data, offset)
+        if offset + 4 > len(data):
+            raise DNSError("报文截断")
+        qtype, _ = struct.unpack("!HH", data[offset:offset + 4])
+        offset += 4
+        question.append((name, qtype))
+
+    sections = []
+    edns_size = None
+    for count in (ancount, nscount, arcount):
+        records = []
+        for _ in range(count):
+            name, offset = _read_name(data, offset)
+            if offset + 10 > len(data):
+                raise DNSError("报文截断")
+            rtype, rclass, ttl, rdlength = struct.unpack("!HHIH", data[offset:offset + 10])
+            offset += 10
+            if offset + rdlength > len(data):
+                raise DNSError("报文截断")
+            if rtype == TYPE_OPT:
+                edns_size = rclass
+            else:
+                records.append(Record(name, rtype, ttl, _parse_rdata(data, offset, rtype, rdlength)))
+            offset += rdlength
+        sections.append(records)
+    return Response(qid, flags, question, *sections, edns_size=edns_size)
+
+def _family(server):
+    return socket.AF_INET6 if ipaddress.ip_address(server).version == 6 else socket.AF_INET
+
+def _check_response(response, qid, qname, qtype):
+    if response.id != qid or not response.flags & 0x8000:
+        return False
+    if response.question and response.question[0] != (normalize_name(qname), qtype):
+        return False
+    return True
+
+def _recv_exact(sock, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise DNSError("TCP 连接被关闭")
+        buf += chunk
+    return buf
+
+def query_tcp(server, message, timeout=QUERY_TIMEOUT, port=None):
+    """通过 TCP 发送报文并读取完整应答"""
+    port = port or DNS_PORT
+    with socket.socket(_family(server), socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((server, port))
+        sock.sendall(struct.pack("!H", len(message)) + message)
+        length = struct.unpack("!H", _recv_exact(sock, 2))[0]
+        return _recv_exact(sock, length)
+
+def query_udp(server, message, qid, qname, qtype, timeout=QUERY_TIMEOUT, port=None):
+    """通过 UDP 发送报文，丢弃 ID/问题不匹配的包，超时返回 None"""
+    port = port or DNS_PORT
+    with socket.socket(_family(server), socket.SOCK_DGRAM) as sock:
+        sock.connect((server, port))
+        sock.send(message)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            sock.settimeout(remaining)
+            try:
+                data = sock.recv(65535)
+            except socket.timeout:
+                return None
+            except ConnectionRefusedError:
+                raise DNSError(f"{server} 拒绝连接")
+            try:
+                response = parse_message(data)
+            except DNSError:
+                continue
+            if _check_response(response, qid, qname, qtype):
+                return response
+
+_server_slots = {}
+_server_slots_lock = threading.Lock()
+
+def _server_slot(server):
+    """按目标服务器限制并发，避免多线程同时压向同一台服务器"""
+    with _server_slots_lock:
+        slot = _server_slots.get(server)
+        if slot is None:
+            slot = _server_slots[server] = threading.BoundedSemaphore(SERVER_CONCURRENCY)
+        return slot
+
+def query(server, qname, qtype=TYPE_A, recursive=True, timeout=QUERY_TIMEOUT,
+          retries=QUERY_RETRIES, edns=True, tcp=False, port=None):
+    """
+    向 server（IP 地址）发送一次查询并返回 Response
+    UDP 每次等待 timeout 秒，超时后重试 retries 次；应答带 TC 位时改用 TCP 重发
+    同一台服务器的并发查询数不超过 SERVER_CONCURRENCY
+    """
+    with _server_slot(server):
+        if not QUERY_OBSERVERS:
+            return _query(server, qname, qtype, recursive, timeout, retries, edns, tcp, port)
+        start = time.monotonic()
+        error = None
+        try:
+            return _query(server, qname, qtype, recursive, timeout, retries, edns, tcp, port)
+        except (DNSError, OSError) as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.monotonic() - start
+            for observer in QUERY_OBSERVERS:
+                observer(server, qtype, elapsed, error)
+
+def _query(server, qname, qtype, recursive, timeout, retries, edns, tcp, port):
+    message, qid = build_query(qname, qtype, recursive=recursive, edns=edns)
+    response = None
+    if not tcp:
+        for _ in range(retries + 1):
+            response = query_udp(server, message, qid, qname, qtype, timeout, port)
+            if response is not None:
+                break
+        if response is None:
+            raise DNSTimeout(f"查询 {qname} @{server} 超时")
+    if tcp or response.tc:
+        try:
+            response = parse_message(query_tcp(server, message, timeout, port))
+        except (OSError, struct.error) as e:
+            raise DNSError(f"TCP 查询 {qname} @{server} 失败: {e}")
+        if not _check_response(response, qid, qname, qtype):
+            raise DNSError(f"TCP 应答与查询 {qname} 不匹配")
+        response.tcp = True
+    response.server = server
+    return response
+
+def is_ip(value):
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+def _query_servers(servers, qname, qtype, timeout, retries):
+    """依次尝试一组 (主机名, 地址) 直到有一台应答，返回 (主机名, 地址, Response)"""
+    servers = list(servers)
+    random.shuffle(servers)
+    for name, address in servers:
+        try:
+            return name, address, query(address, qname, qtype, recursive=False,
+                                        timeout=timeout, retries=retries)
+        except (DNSError, OSError):
+            continue
+    return None
+
+_fanout_executor = ThreadPoolExecutor(max_workers=FANOUT_WORKERS)
+
+def _submit_query(address, qname, qtype, timeout, retries):
+    # 复制调用方的上下文，使 QUERY_OBSERVERS 能看到调用方标注的信息（如查询类别）
+    context = contextvars.copy_context()
+    return _fanout_executor.submit(context.run, query, address, qname, qtype, recursive=False,
+                                   timeout=timeout, retries=retries)
+
+def _race(groups, qname, qtype, timeout, retries, hedge_delay, first_only, budget=None):
+    """
+    每组 (主机名, 地址) 列表先向第一台发出查询；在途查询 hedge_delay 秒内没有应答时
+    向组内下一台再发一次（对冲），查询失败时立即换下一台；每组取最先成功的应答
+    返回 {组: (主机名, 地址, Response) 或 None}；first_only 为真时任意一组成功即返回
+    设置 budget 时最多等待这么多秒，仍未应答的组视为失败，其查询在后台自行结束
+    """
+    deadline = None if budget is None else time.monotonic() + budget
+    remaining = {key: iter(servers) for key, servers in groups.items()}
+    results = {key: None for key in groups}
+    next_hedge = {}   # 组 -> 下一次对冲的时间，没有可对冲的服务器时不在其中
+    pending = {}      # Future -> (组, 主机名, 地址)
+    finished = set()
+
+    def launch(key):
+        for name, address in remaining[key]:
+            pending[_submit_query(address, qname, qtype, timeout, retries)] = (key, name, address)
+            next_hedge[key] = time.monotonic() + hedge_delay
+            return
+        next_hedge.pop(key, None)
+
+    for key in groups:
+        launch(key)
+    while pending and len(finished) < len(groups):
+        wake_at = list(next_hedge.values()) + ([deadline] if deadline is not None else [])
+        wait_for = max(0.0, min(wake_at) - time.monotonic()) if wake_at else None
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for future in done:
+            key, name, address = pending.pop(future)
+            if key in finished:
+                continue
+            try:
+                results[key] = (name, address, future.result())
+            except (DNSError, OSError):
+                launch(key)
+                if not any(k == key for k, _, _ in pending.values()):
+                    finished.add(key)
+                continue
+            finished.add(key)
+            next_hedge.pop(key, None)
+        if first_only and any(results.values()):
+            break
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            break
+        for key, when in list(next_hedge.items()):
+            if key not in finished and when <= now:
+                launch(key)
+    # 还没开始执行的查询不再发出
+    for future in pending:
+        future.cancel()
+    return results
+
+def hedged_query(servers, qname, qtype, timeout=QUERY_TIMEOUT, retries=QUERY_RETRIES,
+                 hedge_delay=HEDGE_DELAY):
+    """与 _query_servers 相同，但慢的服务器不会拖住整个查询：超过 hedge_delay 未应答即并发尝试下一台"""
+    servers = list(servers)
+    random.shuffle(servers)
+    return _race({0: servers}, qname, qtype, timeout, retries, hedge_delay, first_only=True)[0]
+
+def fan_out(servers, qname, qtype, timeout=QUERY_TIMEOUT, retries=QUERY_RETRIES,
+            hedge_delay=HEDGE_DELAY, budget=None):
+    """
+    向每个服务器主机名并发查询，同一主机名的多个地址之间对冲
+    返回 {主机名: (地址, Response) 或 None}，budget 秒内未应答的主机名为 None
+    """
+    groups = {}
+    for name, address in servers:
+        groups.setdefault(name, []).append((name, address))
+    results = _race(groups, qname, qtype, timeout, retries, hedge_delay, first_only=False, budget=budget)
+    return {name: (result[1], result[2]) if result else None for name, result in results.items()}
+
+class ReferralCache:
+    """
+    委派缓存：按 zone 缓存给出该委派的那一跳及 NS 主机名，按 NS 记录的 TTL 过期；
+    同时缓存 glue 及解析出的 NS 主机地址，按 A 记录的 TTL 过期
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.zones = {}       # zone -> (过期时间, Hop)
+        self.addresses = {}   # 主机名 -> (过期时间, 地址集合)
+        self.hits = 0
+        self.misses = 0
+
+    def put_referral(self, hop):
+        referral = hop.response.referral()
+        if referral is None:
+            return
+        zone, ns_names = referral
+        now = time.monotonic()
+        ttl = min(r.ttl for r in hop.response.authority if r.type == TYPE_NS and r.name == zone)
+        with self.lock:
+            self.zones[zone] = (now + ttl, hop)
+            for ns in ns_names:
+                glue = [r for r in hop.response.additional if r.name == ns and r.type == TYPE_A]
+                if glue:
+                    self.addresses[ns] = (now + min(r.ttl for r in glue), {r.data for r in glue})
+
+    def put_addresses(self, name, addresses, ttl):
+        with self.lock:
+            self.addresses[normalize_name(name)] = (time.monotonic() + ttl, set(addresses))
+
+    def get_addresses(self, name):
+        with self.lock:
+            entry = self.addresses.get(normalize_name(name))
+            if entry and entry[0] > time.monotonic():
+                return entry[1]
+            return None
+
+    def closest(self, domain):
+        """返回 domain 严格上级中已缓存且未过期的最深 zone 对应的 Hop，没有则返回 None"""
+        now = time.monotonic()
+        labels = domain.split(".")
+        with self.lock:
+            for i in range(1, len(labels)):
+                entry = self.zones.get(".".join(labels[i:]))
+                if entry and entry[0] > now:
+                    self.hits += 1
+                    return entry[1]
+            self.misses += 1
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.zones.clear()
+            self.addresses.clear()
+
+REFERRAL_CACHE = ReferralCache()
+
+def resolve_address(name, depth=0, cache=REFERRAL_CACHE):
+    """迭代解析主机名的 IPv4 地址，优先使用缓存"""
+    if cache is not None:
+        addresses = cache.get_addresses(name)
+        if addresses is not None:
+            return addresses
+    hops = trace(name, TYPE_A, depth=depth + 1, cache=cache)
+    if not hops:
+        return set()
+    response = hops[-1].response
+    addresses = response.addresses(name)
+    if not addresses:
+        # 跟随 CNAME
+        for record in response.answer:
+            if record.type == TYPE_CNAME and record.name == normalize_name(name):
+                return resolve_address(record.data, depth + 1, cache)
+    elif cache is not None:
+        name = normalize_name(name)
+        cache.put_addresses(name, addresses, min(r.ttl for r in response.records()
+                                                 if r.name == name and r.type == TYPE_A))
+    return addresses
+
+def _servers_for(ns_names, response, depth, cache, all_names=False):
+    """
+    按委派中的 NS 主机名组装可查询的服务器列表，优先使用 glue 和缓存的地址
+    all_names 为真时没有 glue 的主机名也全部解析，否则只要有一台可用即可
+    """
+    servers = []
+    unresolved = []
+    for ns in sorted(ns_names):
+        addresses = response.addresses(ns) or (cache.get_addresses(ns) if cache else None) or ()
+        for address in sorted(addresses):
+            servers.append((ns, address))
+        if not addresses:
+            unresolved.append(ns)
+    if all_names and depth < 2:
+        for ns in unresolved:
+            servers.extend((ns, address) for address in sorted(resolve_address(ns, depth, cache)))
+        return servers
+    if servers or depth >= 2:
+        return servers
+    # 没有 glue 时迭代解析 NS 主机名，找到一台即可
+    for ns in sorted(ns_names):
+        for address in sorted(resolve_address(ns, depth, cache)):
+            servers.append((ns, address))
+        if servers:
+            break
+    return servers
+
+def trace(domain, qtype=TYPE_NS, timeout=QUERY_TIMEOUT, retries=QUERY_RETRIES, depth=0,
+          cache=REFERRAL_CACHE, stop_at_parent=False, hedge_delay=None):
+    """
+    模拟 dig +trace：从根服务器开始逐级跟随委派
+    返回每一跳的 Hop(zone, 服务器主机名, 服务器地址, 应答) 列表，
+    最后一跳是权威应答（或失败前最后一次成功的应答）
+
+    启用 cache 时，domain 严格上级的委派（根、TLD 等）直接取自缓存，
+    对应的那一跳作为第一跳返回，只有 domain 自身的委派每次都向上级 zone 查询；
+    stop_at_parent 为真时，拿到 domain 自身的委派即停止，不再查询其权威服务器；
+    设置 hedge_delay 时每一跳都用对冲查询（见 hedged_query）
+    """
+    domain = normalize_name(domain)
+    hops = []
+    zone = ""
+    servers = list(ROOT_SERVERS.items())
+    cached = cache.closest(domain) if cache is not None else None
+    if cached is not None:
+        zone, ns_names = cached.response.referral()
+        servers = _servers_for(ns_names, cached.response, depth, cache)
+        if servers:
+            hops.append(cached)
+        else:
+            zone, servers = "", list(ROOT_SERVERS.items())
+
+    for _ in range(MAX_TRACE_DEPTH):
+        if hedge_delay is None:
+            result = _query_servers(servers, domain, qtype, timeout, retries)
+        else:
+            result = hedged_query(servers, domain, qtype, timeout, retries, hedge_delay)
+        if result is None:
+            break
+        server, address, response = result
+        hop = Hop(zone, server, address, response)
+        hops.append(hop)
+        referral = response.referral()
+        if referral is None:
+            break
+        child, ns_names = referral
+        # 委派必须向下走，防止服务器把查询指回上级形成循环
+        if child == zone or not (domain == child or domain.endswith("." + child)):
+            break
+        if zone and not (child.endswith("." + zone)):
+            break
+        if cache is not None:
+            cache.put_referral(hop)
+        if stop_at_parent and child == domain:
+            break
+        zone = child
+        servers = _servers_for(ns_names, response, depth, cache)
+        if not servers:
+            break
+    return hops
+
+def parent_referral(hops):
+    """trace 中给出最后一次委派的那一跳，即被查询域的上级 zone 服务器"""
+    for hop in reversed(hops):
+        if hop.response.referral() is not None:
+            return hop
+    return None
+
+def parent_servers(hops, cache=REFERRAL_CACHE):
+    """trace 中上级 zone 的全部权威服务器 (主机名, 地址)，即给出最后一次委派的那一跳所在 zone 的服务器"""
+    for i in range(len(hops) - 1, -1, -1):
+        if hops[i].response.referral() is None:
+            continue
+        if i == 0 and not hops[i].zone:
+            return list(ROOT_SERVERS.items())
+        if i == 0:
+            # 第一跳来自缓存时，其所在 zone 的服务器由更上一级的委派给出
+            previous = cache.closest(hops[i].zone) if cache is not None else None
+            if previous is None:
+                return [(hops[i].server, hops[i].address)]
+            return _servers_for(previous.response.referral()[1], previous.response, 0, cache, all_names=True)
+        zone, ns_names = hops[i - 1].response.referral()
+        return _servers_for(ns_names, hops[i - 1].response, 0, cache, all_names=True)
+    return []
+
+def trace_all_parents(domain, qtype=TYPE_NS, timeout=QUERY_TIMEOUT, retries=QUERY_RETRIES,
+                      cache=REFERRAL_CACHE, hedge_delay=HEDGE_DELAY):
+    """
+    用对冲查询 trace 到 domain 的上级 zone，再向上级 zone 的每一台权威服务器并发查询 domain 的委派
+    返回 (给出最后一次委派的那一跳 或 None, {服务器主机名: Response 或 None})
+    trace 中已经应答过的那台服务器直接复用其应答；其余服务器最多等待一次查询的超时时间，
+    不会因为某台上级服务器无应答而拖住整个域名
+    """
+    hops = trace(domain, qtype, timeout, retries, cache=cache, stop_at_parent=True, hedge_delay=hedge_delay)
+    hop = parent_referral(hops)
+    if hop is None:
+        return None, {}
+    servers = [(name, address) for name, address in parent_servers(hops, cache) if name != hop.server]
+    answers = {name: result and result[1]
+               for name, result in fan_out(servers, domain, qtype, timeout, 0, hedge_delay, timeout).items()}
+    answers[hop.server] = hop.response
+    return hop, answers
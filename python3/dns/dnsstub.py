@@ -0,0 +1,227 @@
+"""
+本地桩 DNS 服务器：按给定的 zone 数据在回环地址上提供权威应答和委派，
+用于离线测试 check_ns / check_ip 的查询逻辑；可模拟应答延迟和 UDP 丢包（见 nsbench.py）
+
+用法：
+    server = StubServer("127.0.0.2", 5353, {
+        "com": [("sina.com", dnsquery.TYPE_NS, "ns1.sina.com"),
+                ("ns1.sina.com", dnsquery.TYPE_A, "127.0.0.3")],
+    })
+    server.start()
+    ...
+    server.stop()
+"""
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+import dnsquery
+
+DEFAULT_TTL = 300
+
+def encode_rdata(rtype, data):
+    if rtype == dnsquery.TYPE_A:
+        return socket.inet_pton(socket.AF_INET, data)
+    if rtype == dnsquery.TYPE_AAAA:
+        return socket.inet_pton(socket.AF_INET6, data)
+    if rtype in (dnsquery.TYPE_NS, dnsquery.TYPE_CNAME, dnsquery.TYPE_PTR):
+        return dnsquery.encode_name(data)
+    if rtype == dnsquery.TYPE_MX:
+        return struct.pack("!H", data[0]) + dnsquery.encode_name(data[1])
+    if rtype == dnsquery.TYPE_SOA:
+        return (dnsquery.encode_name(data[0]) + dnsquery.encode_name(data[1])
+                + struct.pack("!IIIII", *data[2:]))
+    if rtype == dnsquery.TYPE_TXT:
+        strings = (data,) if isinstance(data, str) else data
+        return b"".join(bytes([len(s.encode())]) + s.encode() for s in strings)
+    return data
+
+def encode_record(record):
+    rdata = encode_rdata(record.type, record.data)
+    return (dnsquery.encode_name(record.name)
+            + struct.pack("!HHIH", record.type, dnsquery.CLASS_IN, record.ttl, len(rdata))
+            + rdata)
+
+def build_response(qid, question, rcode=0, aa=False, answer=(), authority=(), additional=(),
+                   rd=False, edns_size=None, limit=None):
+    """构造应答报文；超过 limit 字节时丢弃记录并置 TC 位"""
+    qname, qtype = question
+    body = dnsquery.encode_name(qname) + struct.pack("!HH", qtype, dnsquery.CLASS_IN)
+    sections = [b"".join(encode_record(r) for r in section)
+                for section in (answer, authority, additional)]
+    counts = [len(answer), len(authority), len(additional)]
+    opt = b""
+    if edns_size is not None:
+        opt = b"\x00" + struct.pack("!HHIH", dnsquery.TYPE_OPT, dnsquery.EDNS_UDP_SIZE, 0, 0)
+        counts[2] += 1
+    flags = 0x8000 | (0x0400 if aa else 0) | (0x0100 if rd else 0) | rcode
+    message = struct.pack("!HHHHHH", qid, flags, 1, *counts) + body + b"".join(sections) + opt
+    if limit is not None and len(message) > limit:
+        flags |= 0x0200
+        message = struct.pack("!HHHHHH", qid, flags, 1, 0, 0, 1 if opt else 0) + body + opt
+    return message
+
+class Zone:
+    """一个 zone 的记录集合：(owner, type) -> [Record]"""
+
+    def __init__(self, origin, records=()):
+        self.origin = dnsquery.normalize_name(origin)
+        self.rrsets = {}
+        self.names = set()
+        for record in records:
+            self.add(*record)
+
+    def add(self, name, rtype, data, ttl=DEFAULT_TTL):
+        name = dnsquery.normalize_name(name)
+        if isinstance(data, str) and rtype in (dnsquery.TYPE_NS, dnsquery.TYPE_CNAME):
+            data = dnsquery.normalize_name(data)
+        self.rrsets.setdefault((name, rtype), []).append(dnsquery.Record(name, rtype, ttl, data))
+        # 记录所有存在的名字（含空非终结节点），用于区分 NODATA 与 NXDOMAIN
+        labels = name.split(".") if name else []
+        for i in range(len(labels) + 1):
+            self.names.add(".".join(labels[i:]))
+
+    def contains(self, name):
+        return name == self.origin or not self.origin or name.endswith("." + self.origin)
+
+    def soa(self):
+        return self.rrsets.get((self.origin, dnsquery.TYPE_SOA)) or [
+            dnsquery.Record(self.origin, dnsquery.TYPE_SOA, DEFAULT_TTL,
+                            (f"ns.{self.origin}".strip("."), "hostmaster", 1, 3600, 600, 86400, DEFAULT_TTL))
+        ]
+
+    def glue(self, ns_names):
+        additional = []
+        for ns in sorted(ns_names):
+            for rtype in (dnsquery.TYPE_A, dnsquery.TYPE_AAAA):
+                additional.extend(self.rrsets.get((ns, rtype), []))
+        return additional
+
+    def lookup(self, qname, qtype):
+        """返回 (rcode, aa, answer, authority, additional)"""
+        # 从 zone 顶点向下找最近的委派点
+        labels = qname.split(".")
+        depth = len(self.origin.split(".")) if self.origin else 0
+        for i in range(len(labels) - depth - 1, -1, -1):
+            ns_records = self.rrsets.get((".".join(labels[i:]), dnsquery.TYPE_NS))
+            if ns_records:
+                return (dnsquery.RCODE_NOERROR, False, [], ns_records,
+                        self.glue({r.data for r in ns_records}))
+
+        records = self.rrsets.get((qname, qtype))
+        if records:
+            additional = self.glue({r.data for r in records}) if qtype == dnsquery.TYPE_NS else []
+            return dnsquery.RCODE_NOERROR, True, records, [], additional
+        cname = self.rrsets.get((qname, dnsquery.TYPE_CNAME))
+        if cname:
+            return dnsquery.RCODE_NOERROR, True, cname, [], []
+        if qname in self.names:
+            return dnsquery.RCODE_NOERROR, True, [], self.soa(), []
+        return dnsquery.RCODE_NXDOMAIN, True, [], self.soa(), []
+
+class StubServer:
+    """
+    在 (address, port) 上同时监听 UDP 和 TCP，按最长匹配的 zone 应答
+    每个应答延迟 latency 秒再加 0 到 jitter 秒的随机抖动；UDP 查询以 loss 的概率直接丢弃
+    """
+
+    def __init__(self, address, port, zones, latency=0.0, jitter=0.0, loss=0.0):
+        self.address = address
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.zones = {}
+        for origin, records in zones.items():
+            zone = records if isinstance(records, Zone) else Zone(origin, records)
+            self.zones[zone.origin] = zone
+        self.queries = 0
+        self.dropped = 0
+        self._servers = []
+        self._threads = []
+
+    def answer(self, data, limit=None):
+        try:
+            request = dnsquery.parse_message(data)
+        except dnsquery.DNSError:
+            return None
+        if not request.question:
+            return None
+        self.queries += 1
+        qname, qtype = request.question[0]
+        rd = bool(request.flags & 0x0100)
+        if limit is not None:
+            limit = max(512, request.edns_size or 512)
+        zone = self.find_zone(qname)
+        if zone is None:
+            return build_response(request.id, (qname, qtype), rcode=5, rd=rd,
+                                  edns_size=request.edns_size, limit=limit)
+        rcode, aa, answer, authority, additional = zone.lookup(qname, qtype)
+        return build_response(request.id, (qname, qtype), rcode, aa, answer, authority, additional,
+                              rd=rd, edns_size=request.edns_size, limit=limit)
+
+    def find_zone(self, qname):
+        """最长匹配的 zone，逐级去掉最左边的标签查找，zone 数量多时也不用逐个比较"""
+        labels = qname.split(".") if qname else []
+        for i in range(len(labels) + 1):
+            zone = self.zones.get(".".join(labels[i:]))
+            if zone is not None:
+                return zone
+        return None
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def start(self):
+        stub = self
+
+        class UDPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                data, sock = self.request
+                if stub.loss and random.random() < stub.loss:
+                    stub.dropped += 1
+                    return
+                reply = stub.answer(data, limit=512)
+                stub.delay()
+                if reply:
+                    sock.sendto(reply, self.client_address)
+
+        class TCPHandler(socketserver.BaseRequestHandler):
+            def handle(self):
+                header = self.request.recv(2)
+                if len(header) < 2:
+                    return
+                length = struct.unpack("!H", header)[0]
+                data = b""
+                while len(data) < length:
+                    chunk = self.request.recv(length - len(data))
+                    if not chunk:
+                        return
+                    data += chunk
+                reply = stub.answer(data)
+                stub.delay()
+                if reply:
+                    self.request.sendall(struct.pack("!H", len(reply)) + reply)
+
+        socketserver.ThreadingUDPServer.allow_reuse_address = True
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._servers = [
+            socketserver.ThreadingUDPServer((self.address, self.port), UDPHandler),
+            socketserver.ThreadingTCPServer((self.address, self.port), TCPHandler),
+        ]
+        for server in self._servers:
+            server.daemon_threads = True
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+        self._threads = []
@@ -0,0 +1,175 @@
+"""
+进程内的异步告警分发：检查代码只把告警放入队列，由单独的线程合并后发送，不阻塞检查
+
+- 合并：window 秒内收到的告警（包括 NS 和 NS-IP 两项检查的）合并为一条消息，
+  再发给这些告警所属各通道的发送目标，各目标都收到完整的消息，同一目标只发一次
+- 限频：同一项检查的同一个域名在 repeat_interval 秒内不重复告警，域名恢复后重新计时
+- 发送目标（sink）只需实现 send(message)：
+    ScriptSink      调用原来的告警脚本（参数直接传给解释器，不经过 shell，不读取输出）
+    FileSink        每条消息追加一行 JSON，用于测试和本地查看
+    UnixSocketSink  每条消息作为一个 JSON 数据报发到 unix socket
+"""
+import json
+import queue
+import socket
+import logging
+import threading
+import subprocess
+import time
+from datetime import datetime
+
+WINDOW = 10             # 合并窗口（秒）
+REPEAT_INTERVAL = 1800  # 同一域名重复告警的最短间隔（秒）
+SCRIPT_PYTHON = "python"
+SCRIPT_TIMEOUT = 30
+
+class ScriptSink:
+    def __init__(self, script, python=SCRIPT_PYTHON, timeout=SCRIPT_TIMEOUT):
+        self.script = script
+        self.python = python
+        self.timeout = timeout
+
+    def send(self, message):
+        subprocess.run([self.python, self.script, f"--subject={message}"], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=self.timeout, check=True)
+
+    def __repr__(self):
+        return f"ScriptSink({self.script})"
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, message):
+        line = json.dumps({"time": datetime.now().isoformat(timespec="seconds"), "message": message},
+                          ensure_ascii=False)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def __repr__(self):
+        return f"FileSink({self.path})"
+
+class UnixSocketSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, message):
+        data = json.dumps({"time": datetime.now().isoformat(timespec="seconds"), "message": message},
+                          ensure_ascii=False).encode("utf-8")
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.sendto(data, self.path)
+
+    def __repr__(self):
+        return f"UnixSocketSink({self.path})"
+
+class AlertDispatcher:
+    """
+    sinks 为 {告警通道: sink}，多个通道可以共用同一个 sink；合并不区分通道，
+    同一事件的 NS 和 NS-IP 告警即使发往不同的 sink（两个告警脚本）也在同一条消息中
+    submit(channel, kind, title, domains, lines) 中 kind 为 "problem" 或 "recovered"，
+    lines 为 {域名: 告警中该域名的一行}（默认就是域名本身），限频按域名计算；
+    消息中每个 (通道, 标题) 一段：标题后跟各域名的行，与原来的告警格式相同
+    """
+
+    def __init__(self, sinks, window=WINDOW, repeat_interval=REPEAT_INTERVAL, logger=None):
+        self.sinks = sinks
+        self.window = window
+        self.repeat_interval = repeat_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = queue.SimpleQueue()
+        self.last_alerted = {}  # (通道, 域名) -> 上次告警时间
+        self.pending = None     # (第一条告警到达时间, {(通道, 标题): {域名: 行}}, {sink: None})
+        self.sent = 0
+        self.suppressed = 0
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+        self.thread.start()
+        return self
+
+    def submit(self, channel, kind, title, domains, lines=None):
+        if domains:
+            lines = {domain: (lines or {}).get(domain, domain) for domain in domains}
+            self.queue.put((channel, kind, title, lines, time.monotonic()))
+
+    def stop(self):
+        """发送所有尚未发出的告警后退出，不再等待合并窗口"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _accept(self, channel, kind, domains, now):
+        """限频：过滤掉 repeat_interval 内已经告警过的域名；恢复通知清除记录"""
+        if kind == "recovered":
+            for domain in domains:
+                self.last_alerted.pop((channel, domain), None)
+            return domains
+        accepted = []
+        for domain in domains:
+            last = self.last_alerted.get((channel, domain))
+            if last is not None and now - last < self.repeat_interval:
+                self.suppressed += 1
+                continue
+            self.last_alerted[(channel, domain)] = now
+            accepted.append(domain)
+        return accepted
+
+    def _add(self, item):
+        channel, kind, title, lines, now = item
+        sink = self.sinks.get(channel)
+        if sink is None:
+            return
+        domains = self._accept(channel, kind, list(lines), now)
+        if not domains:
+            return
+        if self.pending is None:
+            self.pending = (now, {}, {})
+        _, sections, sinks = self.pending
+        sinks.setdefault(sink)
+        section = sections.setdefault((channel, title), {})
+        for domain in domains:
+            section[domain] = lines[domain]
+
+    def _flush(self, force=False):
+        if self.pending is None:
+            return
+        first, sections, sinks = self.pending
+        if not force and time.monotonic() - first < self.window:
+            return
+        self.pending = None
+        message = "\n\n".join(f"{title} \n" + "\n".join(section.values())
+                              for (_, title), section in sections.items())
+        for sink in sinks:
+            try:
+                sink.send(message)
+                self.sent += 1
+            except Exception as e:
+                self.logger.warning(f"告警发送失败（{sink!r}）: {e}")
+
+    def _next_timeout(self):
+        if self.pending is None:
+            return None
+        return max(0.0, self.pending[0] + self.window - time.monotonic())
+
+    def _run(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self._next_timeout())
+            except queue.Empty:
+                item = ()
+            if item is None:
+                # 退出前把队列中剩下的告警也合并进去
+                while True:
+                    try:
+                        rest = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if rest is not None:
+                        self._add(rest)
+                self._flush(force=True)
+                return
+            if item:
+                self._add(item)
+            self._flush()
@@ -0,0 +1,232 @@
+"""
+NS / NS-IP 检查的离线基准测试：在回环地址上启动桩根、TLD 和权威服务器（dnsstub），
+模拟大量 zone，可配置应答延迟、UDP 丢包和故意不一致的委派，端到端运行 nscheck 的检查逻辑，
+输出域名/秒、单个域名耗时的 p50/p99，以及 NS / NS-IP 两项检查一致/不一致判定的正确率
+
+不一致的 zone 分三类：
+  ns      子域权威服务器上的 NS 与 TLD 给出的委派不同（两项检查都应判为不一致）
+  ip      子域中 NS 主机名的 A 记录与 TLD 的 glue 不同（只有 NS-IP 检查应判为不一致）
+  parent  两台 TLD 服务器给出的委派不同（--fan-out 时两项检查都应判为不一致，
+          否则取决于 trace 碰巧查询了哪一台）
+
+用法：
+    python3 nsbench.py --zones 5000 --latency 2 --jitter 10 --ns-bad 0.05 --ip-bad 0.05
+    python3 nsbench.py --zones 2000 --loss 0.01 --parent-bad 0.02 --fan-out --json
+"""
+import os
+import json
+import random
+import argparse
+import tempfile
+import time
+import dnsquery
+import dnsstub
+import nscheck
+import nsmetrics
+
+BENCH_TLD = "bench"
+PORT = 5353
+ROOT_ADDRESS = "127.0.0.2"
+TLD_SERVERS = {"a.nic.bench": "127.0.0.3", "b.nic.bench": "127.0.0.5"}
+AUTH_ADDRESS = "127.0.0.4"
+WRONG_ADDRESS = "127.0.0.99"   # ip 类 zone 中 NS 主机名在子域里的（错误）地址
+RESOLVER_PREFIX = "127.0.1."   # 额外的递归 DNS 依次为 127.0.1.1、127.0.1.2 ……
+
+# 各项检查中应判为不一致的 zone 类别
+EXPECTED = {
+    "ns": {"ns", "parent"},
+    "ip": {"ns", "ip", "parent"},
+}
+
+def classify(domains, ns_bad, ip_bad, parent_bad, seed):
+    """按比例随机给每个 zone 指定类别：ok / ns / ip / parent"""
+    rng = random.Random(seed)
+    kinds = {}
+    for domain in domains:
+        r = rng.random()
+        if r < ns_bad:
+            kinds[domain] = "ns"
+        elif r < ns_bad + ip_bad:
+            kinds[domain] = "ip"
+        elif r < ns_bad + ip_bad + parent_bad:
+            kinds[domain] = "parent"
+        else:
+            kinds[domain] = "ok"
+    return kinds
+
+def build_zones(kinds):
+    """返回 (根 zone 记录, {TLD 服务器名: TLD zone 记录}, {子域: 子域记录})"""
+    NS, A = dnsquery.TYPE_NS, dnsquery.TYPE_A
+    root = []
+    for name, address in TLD_SERVERS.items():
+        root += [(BENCH_TLD, NS, name), (name, A, address)]
+    tld = {name: [(BENCH_TLD, NS, ns) for ns in TLD_SERVERS] + [(ns, A, a) for ns, a in TLD_SERVERS.items()]
+           for name in TLD_SERVERS}
+    children = {}
+    for domain, kind in kinds.items():
+        ns1, ns2, ns3 = f"ns1.{domain}", f"ns2.{domain}", f"ns3.{domain}"
+        for i, name in enumerate(TLD_SERVERS):
+            second = ns3 if kind == "parent" and i == 1 else ns2
+            tld[name] += [(domain, NS, ns1), (domain, NS, second),
+                          (ns1, A, AUTH_ADDRESS), (second, A, AUTH_ADDRESS)]
+        child_second = ns3 if kind == "ns" else ns2
+        children[domain] = [(domain, NS, ns1), (domain, NS, child_second),
+                            (ns1, A, WRONG_ADDRESS if kind == "ip" else AUTH_ADDRESS),
+                            (child_second, A, AUTH_ADDRESS)]
+    return root, tld, children
+
+def start_servers(kinds, resolvers, latency, jitter, loss):
+    """启动根、TLD、权威服务器和额外的递归 DNS（与权威服务器数据相同），返回 (服务器列表, 递归 DNS 地址)"""
+    root, tld, children = build_zones(kinds)
+    options = {"latency": latency, "jitter": jitter, "loss": loss}
+    servers = [dnsstub.StubServer(ROOT_ADDRESS, PORT, {"": root}, **options)]
+    for name, address in TLD_SERVERS.items():
+        servers.append(dnsstub.StubServer(address, PORT, {BENCH_TLD: tld[name]}, **options))
+    # 递归 DNS 直接用一台带全部子域数据的桩服务器模拟，direct 查询得到的就是子域中的记录
+    zones = {domain: dnsstub.Zone(domain, records) for domain, records in children.items()}
+    addresses = [AUTH_ADDRESS] + [f"{RESOLVER_PREFIX}{i}" for i in range(1, resolvers)]
+    for address in addresses:
+        servers.append(dnsstub.StubServer(address, PORT, zones, **options))
+    for server in servers:
+        server.start()
+    return servers, addresses
+
+class CountingSink:
+    """只记录告警消息，不发送"""
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append(message)
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+def score(kinds, domains, detected, expected_kinds):
+    """对比判定结果与 zone 类别，返回正确率和误报 / 漏报的域名"""
+    expected = {domain for domain in domains if kinds[domain] in expected_kinds}
+    false_positive = sorted(detected - expected)
+    false_negative = sorted(expected - detected)
+    correct = len(domains) - len(false_positive) - len(false_negative)
+    return {
+        "domains": len(domains),
+        "expected_inconsistent": len(expected),
+        "detected_inconsistent": len(detected),
+        "false_positive": false_positive,
+        "false_negative": false_negative,
+        "accuracy": correct / len(domains) if domains else 1.0,
+    }
+
+def domain_latencies(registry=nsmetrics.REGISTRY):
+    """从 DomainTimer 记录的指标中取出每个域名的总耗时"""
+    latencies = []
+    with registry.lock:
+        for (name, labels), value in registry.gauges.items():
+            if name == "nscheck_domain_duration_seconds" and dict(labels).get("phase") == "total":
+                latencies.append(value)
+    return latencies
+
+def run_bench(zones=2000, ns_bad=0.05, ip_bad=0.05, parent_bad=0.0, latency=0.0, jitter=0.0,
+              loss=0.0, concurrency=nscheck.CONCURRENCY, resolvers=1, ip_fraction=1.0, fan_out=False,
+              seed=1, workdir=None):
+    """启动桩服务器并运行一轮检查，返回结果字典；延迟和抖动单位为秒"""
+    domains = [f"zone{i:05d}.{BENCH_TLD}" for i in range(zones)]
+    kinds = classify(domains, ns_bad, ip_bad, parent_bad, seed)
+    ip_domains = domains[:int(len(domains) * ip_fraction)]
+
+    workdir = workdir or tempfile.mkdtemp(prefix="nsbench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    # 检查日志写在 workdir 中，不使用状态库（每个域名都完整查询一次），告警只计数
+    dnsquery.DNS_PORT = PORT
+    dnsquery.ROOT_SERVERS = {"a.root.bench": ROOT_ADDRESS}
+    dnsquery.REFERRAL_CACHE.clear()
+    nscheck.STATE_DB = None
+    nscheck.CONCURRENCY = concurrency
+    alerts = CountingSink()
+    nsmetrics.REGISTRY.clear()
+
+    servers, addresses = start_servers(kinds, resolvers, latency, jitter, loss)
+    checker = nscheck.Checker(metrics_file=None, domain_timing=True, fan_out=fan_out, dns_servers=addresses,
+                              alert_sinks={"ns": alerts, "ip": alerts})
+    try:
+        start = time.monotonic()
+        checker.check(domains, ip_domains)
+        elapsed = time.monotonic() - start
+    finally:
+        checker.close()
+        for server in servers:
+            server.stop()
+
+    latencies = domain_latencies()
+    return {
+        "zones": zones,
+        "kinds": {kind: sum(k == kind for k in kinds.values()) for kind in ("ok", "ns", "ip", "parent")},
+        "resolvers": len(addresses),
+        "fan_out": fan_out,
+        "elapsed": elapsed,
+        "domains_per_second": zones / elapsed if elapsed > 0 else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p99": percentile(latencies, 99),
+        "latency_max": max(latencies, default=0.0),
+        "queries": sum(server.queries for server in servers),
+        "dropped": sum(server.dropped for server in servers),
+        "alerts": len(alerts.messages),
+        "ns": score(kinds, domains, checker.last_inconsistent.get("ns", set()), EXPECTED["ns"]),
+        "ip": score(kinds, ip_domains, checker.last_inconsistent.get("ip", set()), EXPECTED["ip"]),
+        "workdir": workdir,
+    }
+
+def print_report(result):
+    print(f"zone 数: {result['zones']}  类别: {result['kinds']}  递归 DNS: {result['resolvers']}  "
+          f"fan-out: {result['fan_out']}")
+    print(f"耗时: {result['elapsed']:.2f}s  域名/秒: {result['domains_per_second']:.1f}")
+    print(f"单个域名耗时 p50: {result['latency_p50'] * 1000:.1f}ms  p99: {result['latency_p99'] * 1000:.1f}ms  "
+          f"max: {result['latency_max'] * 1000:.1f}ms")
+    print(f"桩服务器收到查询: {result['queries']}  丢弃: {result['dropped']}  告警: {result['alerts']}")
+    for check in ("ns", "ip"):
+        s = result[check]
+        print(f"[{check}] 域名 {s['domains']}  应为不一致 {s['expected_inconsistent']}  "
+              f"判为不一致 {s['detected_inconsistent']}  误报 {len(s['false_positive'])}  "
+              f"漏报 {len(s['false_negative'])}  正确率 {s['accuracy']:.2%}")
+        for label, key in (("误报", "false_positive"), ("漏报", "false_negative")):
+            if s[key]:
+                print(f"    {label}: {s[key][:10]}{' ...' if len(s[key]) > 10 else ''}")
+    print(f"日志目录: {result['workdir']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="NS / NS-IP 检查的离线基准测试")
+    parser.add_argument("--zones", type=int, default=2000, help="模拟的 zone 数")
+    parser.add_argument("--ns-bad", type=float, default=0.05, help="子域 NS 与委派不一致的 zone 比例")
+    parser.add_argument("--ip-bad", type=float, default=0.05, help="NS 地址与 glue 不一致的 zone 比例")
+    parser.add_argument("--parent-bad", type=float, default=0.0, help="两台 TLD 服务器委派不一致的 zone 比例")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个应答的固定延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="每个应答额外的随机延迟上限（毫秒）")
+    parser.add_argument("--loss", type=float, default=0.0,
+                        help="UDP 丢包率，丢包后按 dnsquery.QUERY_TIMEOUT 超时重试")
+    parser.add_argument("-c", "--concurrency", type=int, default=nscheck.CONCURRENCY, help="同时检查的域名数")
+    parser.add_argument("--resolvers", type=int, default=1, help="同时检查的递归 DNS 数")
+    parser.add_argument("--ip-fraction", type=float, default=1.0, help="同时做 NS-IP 检查的域名比例")
+    parser.add_argument("--fan-out", action="store_true", help="向全部上级服务器并发查询（见 nscheck --fan-out）")
+    parser.add_argument("--seed", type=int, default=1, help="zone 类别的随机种子")
+    parser.add_argument("--workdir", help="检查日志的输出目录，默认新建临时目录")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    result = run_bench(args.zones, args.ns_bad, args.ip_bad, args.parent_bad, args.latency / 1000,
+                       args.jitter / 1000, args.loss, args.concurrency, args.resolvers, args.ip_fraction,
+                       args.fan_out, args.seed, args.workdir)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,764 @@
+import json
+import fcntl
+import argparse
+import logging
+import threading
+import time
+import contextlib
+import dnsquery
+import nsalert
+import nslog
+import nsmetrics
+import nsstore
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+DNS_SERVER = "123.125.29.99"
+DNS_SERVERS = [DNS_SERVER]  # 需要检查的递归 DNS，每个域名只做一次 trace，各 DNS 的结果都与它对比
+NS_DNS_FILE = "dns-ns.txt"
+IP_DNS_FILE = "dns-ip.txt"
+NS_LOG_FILE = "dns-ns.log"
+CONSISTENT_LOG = "ns_consistent.log"
+INCONSISTENT_LOG = "ns_inconsistent.log"
+IP_LOG_FILE = "dns-ip.log"
+RECORDS_FILE = "dns-check.jsonl"  # 每个域名每项检查一条 JSON 记录，设为 None 不写
+RULES_FILE = "dns-rules.json"
+LOCK_FILE = "nscheck-{}.lock"  # 每项检查一个进程锁，{} 为检查名（ns / ip）
+CONCURRENCY = 32  # 同时检查的域名数上限，1 为串行
+STATE_DB = "dns-state.db"  # 跨次运行的状态库，设为 None 关闭（每次全部重查、每次都告警）
+MAX_STATE_AGE = 3600       # 结果最长复用时间（秒），实际取记录 TTL 与它的较小值
+METRICS_FILE = None        # 每轮结束后写入的 Prometheus textfile 路径，None 为不写
+DOMAIN_TIMING = False      # 指标中是否包含每个域名各阶段的耗时
+FAN_OUT = False            # trace 时向上级 zone 的全部权威服务器并发查询（对冲），并对比各服务器给出的 NS
+
+NS_ALERT_SCRIPT = "/data0/nscheck/send_alert_3.py"
+IP_ALERT_SCRIPT = "/data0/nscheck/send_alert_3_ip.py"
+ALERT_WINDOW = nsalert.WINDOW                    # 合并窗口内的 NS / NS-IP 告警合并为一条
+ALERT_REPEAT_INTERVAL = nsalert.REPEAT_INTERVAL  # 同一域名重复告警的最短间隔（秒）
+ALERT_FILE = None    # 告警改为写入该文件（JSON-lines），不调用告警脚本，用于测试
+ALERT_SOCKET = None  # 告警改为发到该 unix socket（数据报），不调用告警脚本
+
+# 按域名配置的特殊规则，RULES_FILE 中的同名配置会覆盖这里的默认值
+#   ip_ns: 对比 NS 对应 IP 时只关注这些 NS，其余 NS 忽略
+DOMAIN_RULES = {
+    "sina.com": {"ip_ns": ["ns1.sina.com", "ns2.sina.com", "ns3.sina.com", "ns4.sina.com"]},
+}
+
+dnsquery.QUERY_OBSERVERS.append(nsmetrics.observe_query)
+_log_pipeline = None
+_alerts = None
+
+def load_rules(path=RULES_FILE):
+    """合并默认规则和规则文件，域名统一为小写"""
+    rules = {domain.lower(): dict(rule) for domain, rule in DOMAIN_RULES.items()}
+    try:
+        with open(path, "r") as f:
+            for domain, rule in json.load(f).items():
+                rules.setdefault(domain.lower(), {}).update(rule)
+    except FileNotFoundError:
+        pass
+    return rules
+
+def setup_logging():
+    """
+    NS 检查：总日志 + 一致/不一致日志；IP 检查：单独的总日志；两项检查每个域名的结构化记录写入 RECORDS_FILE
+    各 logger 只写内存队列，由 nslog 的写盘线程生成人可读日志和 JSON-lines 并写盘（按大小/时间轮转），
+    进程退出前需调用 shutdown_logging 写完剩余记录
+    """
+    global _log_pipeline
+    if _log_pipeline is None:
+        pipeline = nslog.LogPipeline()
+        human = '%(asctime)s %(levelname)s %(message)s'
+        pipeline.add_file(NS_LOG_FILE, nslog.HumanFormatter(human, render_event), ["dns_check"])
+        pipeline.add_file(CONSISTENT_LOG, logging.Formatter('%(asctime)s %(message)s'), ["consistent"])
+        pipeline.add_file(INCONSISTENT_LOG, logging.Formatter('%(asctime)s %(message)s'), ["inconsistent"])
+        pipeline.add_file(IP_LOG_FILE, nslog.HumanFormatter(human, render_event), ["dns_ip"])
+        if RECORDS_FILE:
+            pipeline.add_file(RECORDS_FILE, nslog.JsonFormatter(), record_filter=nslog.has_event)
+        pipeline.attach("dns_check", logging.DEBUG)
+        pipeline.attach("consistent")
+        pipeline.attach("inconsistent")
+        pipeline.attach("dns_ip")
+        _log_pipeline = pipeline.start()
+    return tuple(logging.getLogger(name) for name in ("dns_check", "consistent", "inconsistent", "dns_ip"))
+
+def shutdown_logging():
+    global _log_pipeline
+    if _log_pipeline is not None:
+        _log_pipeline.stop()
+        _log_pipeline = None
+
+def alert_sinks(alert_file=ALERT_FILE, alert_socket=ALERT_SOCKET):
+    """
+    各告警通道的发送目标：默认分别调用两个告警脚本，指定文件或 socket 时两项检查共用
+    两种情况下同一合并窗口内的 NS / NS-IP 告警都合并为一条，默认时两个脚本各收到一次
+    """
+    if alert_file:
+        sink = nsalert.FileSink(alert_file)
+    elif alert_socket:
+        sink = nsalert.UnixSocketSink(alert_socket)
+    else:
+        return {"ns": nsalert.ScriptSink(NS_ALERT_SCRIPT), "ip": nsalert.ScriptSink(IP_ALERT_SCRIPT)}
+    return {"ns": sink, "ip": sink}
+
+def setup_alerts(sinks=None):
+    """启动告警分发线程，进程退出前需调用 shutdown_alerts 发出尚未发送的告警"""
+    global _alerts
+    if _alerts is None:
+        _alerts = nsalert.AlertDispatcher(sinks or alert_sinks(), ALERT_WINDOW, ALERT_REPEAT_INTERVAL,
+                                          logging.getLogger("dns_check")).start()
+    return _alerts
+
+def shutdown_alerts():
+    global _alerts
+    if _alerts is not None:
+        _alerts.stop()
+        _alerts = None
+
+def send_alert(channel, kind, title, domains, lines=None):
+    """告警只放入分发队列，立即返回；channel 为 ns / ip，kind 为 problem / recovered"""
+    setup_alerts().submit(channel, kind, title, domains, lines)
+
+def read_domains(path):
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+def query_direct_ns(domain, dns_server=DNS_SERVER):
+    """从指定 DNS 查询域名的 NS 记录，返回 (NS 集合, 最小 TTL)"""
+    try:
+        with nsmetrics.query_kind("direct"):
+            response = dnsquery.query(dns_server, domain, dnsquery.TYPE_NS)
+    except (dnsquery.DNSError, OSError):
+        return set(), 0
+    return response.ns_names(), _min_ttl(response.answer + response.authority, dnsquery.TYPE_NS)
+
+def get_direct_ns(domain):
+    """从指定 DNS 查询域名的 NS 记录"""
+    return query_direct_ns(domain)[0]
+
+def get_trace_hop(domain):
+    """从根开始逐级跟随委派，返回给出最后一次委派的那一跳（上级 zone 服务器）"""
+    try:
+        with nsmetrics.query_kind("trace"):
+            return dnsquery.parent_referral(dnsquery.trace(domain, stop_at_parent=True))
+    except (dnsquery.DNSError, OSError):
+        return None
+
+def get_parent_answers(domain):
+    """
+    向上级 zone 的每一台权威服务器查询域名的委派（对冲查询，慢的服务器不拖住整个域名）
+    返回 (给出委派的那一跳 或 None, {上级服务器名: NS 集合，未应答为 None})
+    """
+    try:
+        with nsmetrics.query_kind("trace"):
+            hop, answers = dnsquery.trace_all_parents(domain)
+    except (dnsquery.DNSError, OSError):
+        return None, {}
+    return hop, {server: response.ns_names() if response is not None else None
+                 for server, response in answers.items()}
+
+def get_trace_hop_ns(domain):
+    """返回上级 zone 服务器名及其给出的 NS 记录"""
+    hop = get_trace_hop(domain)
+    if hop is None:
+        return None, set()
+    return hop.server, hop.response.ns_names()
+
+class NsAddressResolver:
+    """
+    NS 主机名地址解析层：按 (服务器地址, 主机名) 去重，同一轮检查中多个域名共用的 NS
+    只查询一次；A 与 AAAA 在独立的线程池中并发查询
+    preload 为状态库中仍在 TTL 内的结果，命中时不再查询
+    """
+
+    def __init__(self, max_workers=CONCURRENCY, preload=None, executor=None):
+        self.own_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.lookups = {}   # (服务器地址, 主机名) -> {记录类型: Future}
+        self.preloaded = set()
+        for key, value in (preload or {}).items():
+            future = Future()
+            future.set_result(value)
+            self.lookups[key] = {dnsquery.TYPE_A: future}
+            self.preloaded.add(key)
+
+    def _query(self, server, name, rtype):
+        """返回 (地址集合, 最小 TTL)，查询失败返回 None"""
+        try:
+            with nsmetrics.query_kind("ns_addr"):
+                response = dnsquery.query(server, name, rtype, timeout=5, retries=3)
+        except (dnsquery.DNSError, OSError):
+            return None
+        return response.addresses(name, (rtype,)), _min_ttl(response.records(), rtype, name)
+
+    def submit(self, server, name):
+        """提交 (server, name) 的 A/AAAA 查询，已提交过的直接复用"""
+        key = (server, dnsquery.normalize_name(name))
+        with self.lock:
+            if key not in self.lookups:
+                self.lookups[key] = {rtype: self.executor.submit(self._query, server, key[1], rtype)
+                                     for rtype in (dnsquery.TYPE_A, dnsquery.TYPE_AAAA)}
+        return key
+
+    def result(self, server, name):
+        """等待并返回 (地址集合, 最小 TTL)；全部查询失败时返回 None"""
+        key = self.submit(server, name)
+        addresses, ttls, ok = set(), [], False
+        for future in self.lookups[key].values():
+            value = future.result()
+            if value is None:
+                continue
+            ok = True
+            addresses |= value[0]
+            if value[1] is not None:
+                ttls.append(value[1])
+        if not ok:
+            return None
+        return addresses, min(ttls) if ttls else None
+
+    def export(self):
+        """本轮新查询且成功的结果，用于写回状态库"""
+        exported = {}
+        for key in list(self.lookups):
+            if key in self.preloaded:
+                continue
+            value = self.result(*key)
+            if value is not None and value[1] is not None:
+                exported[key] = value
+        return exported
+
+    def shutdown(self):
+        if self.own_executor:
+            self.executor.shutdown()
+
+def query_ns_ips(dns_server, ns_set, resolver):
+    """查询 NS 主机名对应的 IP 地址（A/AAAA 记录，包括附加段中的 glue），返回 (映射, 最小 TTL)"""
+    ns_ip_map = {}
+    ttl = None
+    if dnsquery.is_ip(dns_server):
+        addresses = [dns_server]
+    else:
+        addresses = sorted(dnsquery.resolve_address(dns_server))
+    # 先把所有查询提交出去，再逐个等待结果
+    for ns in ns_set:
+        for address in addresses[:1]:
+            resolver.submit(address, ns)
+    for ns in ns_set:
+        ns_ip_map[ns] = set()
+        for address in addresses:
+            value = resolver.result(address, ns)
+            if value is None:
+                continue
+            ns_ip_map[ns] = value[0]
+            if value[1] is not None:
+                ttl = value[1] if ttl is None else min(ttl, value[1])
+            break
+    return ns_ip_map, ttl
+
+def get_ns_ips(dns_server, ns_set):
+    """查询 NS 主机名对应的 IP 地址（A/AAAA 记录，包括附加段中的 glue）"""
+    resolver = NsAddressResolver()
+    try:
+        return query_ns_ips(dns_server, ns_set, resolver)[0]
+    finally:
+        resolver.shutdown()
+
+def _min_ttl(records, rtype, name=None, current=None):
+    ttls = [r.ttl for r in records if r.type == rtype and (name is None or r.name == name)]
+    if current is not None:
+        ttls.append(current)
+    return min(ttls) if ttls else current
+
+def query_direct_all(domain, dns_servers, executor=None):
+    """并发向各个 DNS 查询域名的 NS 记录，返回 {DNS: (NS 集合, 最小 TTL)}"""
+    if executor is None or len(dns_servers) == 1:
+        return {server: query_direct_ns(domain, server) for server in dns_servers}
+    futures = {server: executor.submit(query_direct_ns, domain, server) for server in dns_servers}
+    return {server: future.result() for server, future in futures.items()}
+
+def resolve_domain(domain, need_ips, resolver=None, timing=False, fan_out=False, dns_servers=None,
+                   executor=None):
+    """
+    对一个域名做一次 trace，并向 dns_servers 中的每个 DNS 各做一次 direct 查询（有 executor 时并发）；
+    need_ips 为真时再通过 resolver 查各 NS 的 IP
+    结果中 direct / direct_ips 按 DNS 区分；ttl 为所有相关记录的最小 TTL，任何一步没有拿到记录时为 0
+    timing 为真时把各阶段耗时记入指标；fan_out 为真时结果中的 parent_ns 为上级 zone
+    每台服务器给出的 NS 集合
+    """
+    dns_servers = dns_servers or DNS_SERVERS
+    timer = nsmetrics.DomainTimer(domain, timing)
+    with timer.phase("direct"):
+        direct = query_direct_all(domain, dns_servers, executor)
+    with timer.phase("trace"):
+        if fan_out:
+            hop, parent_ns = get_parent_answers(domain)
+        else:
+            hop, parent_ns = get_trace_hop(domain), None
+    result = {
+        "direct": {server: ns for server, (ns, _) in direct.items()},
+        "trace_server": hop.server if hop else None,
+        "trace_ns": hop.response.ns_names() if hop else set(),
+        "direct_ips": {server: {} for server in dns_servers},
+        "trace_ns_ips": {},
+    }
+    if parent_ns is not None:
+        result["parent_ns"] = parent_ns
+    ttls = [ttl or 0 for _, ttl in direct.values()]
+    ttls.append(_min_ttl(hop.response.authority, dnsquery.TYPE_NS) or 0 if hop else 0)
+    if need_ips and hop:
+        with timer.phase("ns_addr"):
+            # 先提交所有 DNS 的查询，各 DNS 之间并发
+            for server in filter(dnsquery.is_ip, dns_servers):
+                for ns in result["direct"][server]:
+                    resolver.submit(server, ns)
+            for server in dns_servers:
+                result["direct_ips"][server], ip_ttl = query_ns_ips(server, result["direct"][server], resolver)
+                ttls.append(ip_ttl or 0)
+            result["trace_ns_ips"], trace_ip_ttl = query_ns_ips(hop.address, result["trace_ns"], resolver)
+        ttls.append(trace_ip_ttl or 0)
+    result["ttl"] = min(ttls)
+    timer.finish()
+    return result
+
+def track_status(store, check_name, domains, inconsistent_domains):
+    """
+    对比上次记录的状态，返回 (新出现的不一致域名, 恢复一致的域名)
+    没有状态库时每次都对全部不一致域名告警
+    """
+    if store is None:
+        return list(inconsistent_domains), []
+    new_domains, recovered = [], []
+    for domain in dict.fromkeys(domains):
+        consistent = domain not in inconsistent_domains
+        previous = store.update_status(check_name, domain, consistent)
+        if not consistent and previous is not False:
+            new_domains.append(domain)
+        elif consistent and previous is False:
+            recovered.append(domain)
+    store.commit()
+    return new_domains, recovered
+
+def parents_differ(parent_ns):
+    """fan-out 模式下上级 zone 各服务器（已应答的）给出的 NS 是否不一致"""
+    answered = [frozenset(ns) for ns in (parent_ns or {}).values() if ns is not None]
+    return len(set(answered)) > 1
+
+def _at(server, dns_servers):
+    """检查多个 DNS 时在日志中标明是哪一个"""
+    return "" if len(dns_servers) == 1 else f"（@{server}）"
+
+def _ns_diff_lines(direct_ns, trace_ns, label=""):
+    only_in_direct = sorted(set(direct_ns) - set(trace_ns))
+    only_in_trace = sorted(set(trace_ns) - set(direct_ns))
+    lines = []
+    if only_in_direct:
+        lines.append((logging.INFO, f"   ➕ 仅在 direct{label} 中出现: {only_in_direct}"))
+    if only_in_trace:
+        lines.append((logging.INFO, f"   ➖ 仅在 trace 中出现: {only_in_trace}"))
+    return lines
+
+def domain_event(check_name, domain, result, cached, dns_servers):
+    """一个域名一项检查的结构化记录（可 JSON 序列化），人可读日志由 render_event 从它生成"""
+    event = {
+        "check": check_name,
+        "domain": domain,
+        "cached": cached,
+        "direct": {server: sorted(result["direct"][server]) for server in dns_servers},
+        "trace_server": result["trace_server"],
+        "trace_ns": sorted(result["trace_ns"]),
+    }
+    if "parent_ns" in result:
+        event["parent_ns"] = {server: None if ns is None else sorted(ns)
+                              for server, ns in sorted(result["parent_ns"].items())}
+    event["mismatched"] = [server for server in dns_servers if result["direct"][server] != result["trace_ns"]]
+    return event
+
+def render_event(event):
+    """把 domain_event 记录展开为 [(日志级别, 文本)]，即原来逐行写入 dns-ns.log / dns-ip.log 的内容"""
+    domain, direct, trace_ns = event["domain"], event["direct"], event["trace_ns"]
+    lines = [(logging.INFO, f"\n🌐 检查域名: {domain}")]
+    if event["cached"]:
+        lines.append((logging.INFO, "♻️ 记录仍在 TTL 内，使用上次查询结果"))
+    for server, ns in direct.items():
+        lines.append((logging.INFO, f"🔸 @指定DNS({server})返回 NS记录: {ns}"))
+    if event["trace_server"]:
+        lines.append((logging.INFO, f"🔹 trace 中途（来自 {event['trace_server']}）返回 NS记录: {trace_ns}"))
+    else:
+        level = logging.WARNING if event["check"] == "ns" else logging.ERROR
+        lines.append((level, "❌ trace 中未获取有效中转 NS"))
+
+    parent_ns = event.get("parent_ns")
+    if parent_ns:
+        unanswered = [server for server, ns in parent_ns.items() if ns is None]
+        answered = {server: ns for server, ns in parent_ns.items() if ns is not None}
+        if unanswered:
+            lines.append((logging.WARNING, f"⚠️ 上级 zone 服务器未应答: {unanswered}"))
+        if parents_differ(parent_ns):
+            lines.append((logging.ERROR, "❌ 上级 zone 各服务器返回的 NS 记录不一致"))
+            lines += [(logging.INFO, f"   🔹 {server}: {ns}") for server, ns in answered.items()]
+        else:
+            lines.append((logging.INFO, f"✅ 上级 zone 的 {len(answered)} 台服务器返回的 NS 记录一致"))
+
+    mismatched = event["mismatched"]
+    ns_ok = not mismatched if event["check"] == "ip" else event["consistent"]
+    if ns_ok:
+        lines.append((logging.INFO, "✅ NS 记录一致"))
+    else:
+        lines.append((logging.ERROR, "❌ NS 记录不一致"))
+        for server in mismatched:
+            lines += _ns_diff_lines(direct[server], trace_ns, _at(server, direct))
+
+    if event["check"] == "ip" and event["trace_server"]:
+        if event.get("ignored_ns"):
+            lines.append((logging.INFO, f"🔍 域名 {domain} 忽略非特定 NS: {event['ignored_ns']}"))
+        ip_mismatch = False
+        for item in event["ips"]:
+            at = _at(item["server"], direct)
+            if item["direct"] == item["trace"]:
+                lines.append((logging.INFO, f"✅ NS {item['ns']} 的 IP 一致{at}"))
+            else:
+                ip_mismatch = True
+                lines.append((logging.ERROR, f"❌ NS {item['ns']} 的 IP 不一致{at}"))
+                lines.append((logging.INFO, f"   ➕ direct IP: {item['direct']}"))
+                lines.append((logging.INFO, f"   ➖ trace IP : {item['trace']}"))
+        if ip_mismatch:
+            lines.append((logging.ERROR, "❌ NS对应IP地址不一致"))
+        else:
+            lines.append((logging.INFO, "✅ 所有 NS 的 IP 地址一致"))
+    return lines
+
+def _log_event(logger, event):
+    logger.log(logging.INFO if event["consistent"] else logging.ERROR,
+               f"{event['domain']} {event['check']} {'consistent' if event['consistent'] else 'inconsistent'}",
+               extra={"event": event})
+
+def log_resolver_matrix(logger, dns_servers, mismatches):
+    """
+    检查多个 DNS 时输出对比矩阵：每行一个有 DNS 与 trace 不一致的域名，每列一个 DNS
+    并记录各 DNS 的不一致域名数
+    """
+    if len(dns_servers) < 2:
+        return
+    counts = {server: sum(server in servers for servers in mismatches.values()) for server in dns_servers}
+    for server, count in counts.items():
+        logger.info(f"@{server} 不一致域名数: {count}")
+    if not mismatches:
+        return
+    width = max(len(domain) for domain in mismatches)
+    logger.info("DNS 对比矩阵（❌ 表示该 DNS 返回的结果与 trace 不一致）:")
+    logger.info(" " * width + "  " + "  ".join(dns_servers))
+    for domain, servers in mismatches.items():
+        # emoji 占两个字符宽度
+        cells = [("❌" if server in servers else "✅") + " " * (len(server) - 2) for server in dns_servers]
+        logger.info((domain.ljust(width) + "  " + "  ".join(cells)).rstrip())
+
+def _alert_lines(domains, mismatches, dns_servers):
+    """告警中每个域名的一行，多个 DNS 时标明不一致的 DNS"""
+    if len(dns_servers) == 1:
+        return {domain: domain for domain in domains}
+    return {domain: f"{domain} {' '.join('@' + s for s in sorted(mismatches.get(domain, ())))}".rstrip()
+            for domain in domains}
+
+def _record_resolver_metrics(check_name, dns_servers, mismatches):
+    for server in dns_servers:
+        nsmetrics.REGISTRY.set("nscheck_resolver_inconsistent_domains",
+                               sum(server in servers for servers in mismatches.values()),
+                               check=check_name, resolver=server)
+
+def report_ns(loggers, domains, results, store=None, cached=(), dns_servers=None):
+    """NS 一致性：对比各 DNS（direct）与 trace 的 NS 集合，写日志，仅在状态变化时告警"""
+    logger, consistent_logger, inconsistent_logger = loggers
+    dns_servers = dns_servers or DNS_SERVERS
+    inconsistent_domains = []  # 存储不一致的域名
+    consistent_domains = []
+    mismatches = {}  # 域名 -> 与 trace 不一致的 DNS
+
+    for domain in domains:
+        result = results[domain].result()
+        event = domain_event("ns", domain, result, domain in cached, dns_servers)
+        event["consistent"] = not event["mismatched"] and not parents_differ(event.get("parent_ns"))
+        _log_event(logger, event)
+
+        if event["consistent"]:
+            consistent_logger.info(f"{domain} - NS记录一致")
+            consistent_domains.append(domain)
+        else:
+            inconsistent_logger.info(f"{domain} - NS记录不一致")
+            inconsistent_domains.append(domain)
+            if event["mismatched"]:
+                mismatches[domain] = set(event["mismatched"])
+
+    new_domains, recovered = track_status(store, "ns", domains, set(inconsistent_domains))
+    if len(inconsistent_domains) != 0:
+        logger.info(inconsistent_domains)
+    if new_domains:
+        send_alert("ns", "problem", "⚠️  以下域NS记录direct和trace结果不一致,请核实!", new_domains,
+                   _alert_lines(new_domains, mismatches, dns_servers))
+    if recovered:
+        send_alert("ns", "recovered", "✅ 以下域NS记录direct和trace结果已恢复一致", recovered)
+
+    logger.info(f"总域名数: {len(domains)}")
+    logger.info(f"不一致域名数: {len(inconsistent_domains)}")
+    logger.info("不一致域名列表:")
+    for i, domain in enumerate(inconsistent_domains, 1):
+        logger.info(f"{i}. {domain}")
+    log_resolver_matrix(logger, dns_servers, mismatches)
+    _record_resolver_metrics("ns", dns_servers, mismatches)
+    return set(inconsistent_domains)
+
+def report_ip(logger, domains, results, rules, store=None, cached=(), dns_servers=None):
+    """NS 及其 IP 一致性：在 NS 对比之外再对比各 NS 的 IP，写日志，仅在状态变化时告警"""
+    dns_servers = dns_servers or DNS_SERVERS
+    # 用于统计不一致的域名和NS
+    inconsistent_domains = set()
+    inconsistent_ns_records = []
+    mismatches = {}  # 域名 -> NS 或其 IP 与 trace 不一致的 DNS
+
+    for domain in domains:
+        result = results[domain].result()
+        event = domain_event("ip", domain, result, domain in cached, dns_servers)
+        direct, trace_ns = result["direct"], result["trace_ns"]
+        mismatched = set(event["mismatched"])
+        domain_has_issue = bool(mismatched) or not result["trace_server"] or parents_differ(event.get("parent_ns"))
+
+        # 对比 NS 对应的 IP
+        event["ips"] = []
+        if result["trace_server"]:
+            all_ns = set(trace_ns).union(*direct.values())
+            # 按域名规则只关注特定 NS
+            rule = rules.get(domain.lower(), {})
+            if rule.get("ip_ns"):
+                filtered_ns = set(rule["ip_ns"]) & all_ns
+                event["ignored_ns"] = sorted(all_ns - filtered_ns)
+            else:
+                filtered_ns = all_ns
+
+            for ns in sorted(filtered_ns):
+                trace_ips = sorted(result["trace_ns_ips"].get(ns, set()))
+                for server in dns_servers:
+                    direct_ips = sorted(result["direct_ips"][server].get(ns, set()))
+                    event["ips"].append({"ns": ns, "server": server, "direct": direct_ips, "trace": trace_ips})
+                    if direct_ips != trace_ips:
+                        domain_has_issue = True
+                        mismatched.add(server)
+                        inconsistent_ns_records.append(
+                            f"{domain}: {ns}{_at(server, dns_servers)} (Direct: {direct_ips}, Trace: {trace_ips})")
+
+        event["consistent"] = not domain_has_issue
+        _log_event(logger, event)
+        if mismatched:
+            mismatches[domain] = mismatched
+        # 如果这个域名有任何问题，添加到统计中
+        if domain_has_issue:
+            inconsistent_domains.add(domain)
+
+    new_domains, recovered = track_status(store, "ip", domains, inconsistent_domains)
+    if new_domains:
+        send_alert("ip", "problem", "⚠️  域名NS及其ip direct和trace结果不一致,请核实!", new_domains,
+                   _alert_lines(new_domains, mismatches, dns_servers))
+    if recovered:
+        send_alert("ip", "recovered", "✅ 域名NS及其ip direct和trace结果已恢复一致", recovered)
+
+    # 统计并打印不一致情况
+    if inconsistent_domains:
+        logger.error("\n" + "="*60)
+        logger.error("⚠️ 检测到不一致的域名统计")
+        logger.error("="*60)
+        logger.error(f"不一致域名总数: {len(inconsistent_domains)}")
+        logger.error(f"不一致域名列表: {sorted(inconsistent_domains)}")
+
+        if inconsistent_ns_records:
+            logger.error("\n不一致的NS记录详情:")
+            for record in inconsistent_ns_records:
+                logger.error(f"  - {record}")
+        logger.error("="*60)
+    else:
+        logger.info("\n✅ 所有域名检查一致，未发现不一致情况")
+    log_resolver_matrix(logger, dns_servers, mismatches)
+    _record_resolver_metrics("ip", dns_servers, mismatches)
+    return inconsistent_domains
+
+class Checker:
+    """
+    一轮或多轮检查共用的状态：日志、域名规则、状态库和线程池
+    单次运行（cron）时只检查一轮；常驻进程（dnsdaemon.py）在多轮之间复用同一个实例，
+    dnsquery 中的委派缓存也随进程一直保留
+    每轮结束后更新 nsmetrics 中的指标，设置了 metrics_file 时写入 textfile
+    告警由 nsalert 的分发线程合并后发送，alert_sinks 为 {"ns"/"ip": sink}，默认见 alert_sinks()
+    """
+
+    def __init__(self, metrics_file=METRICS_FILE, domain_timing=DOMAIN_TIMING, fan_out=FAN_OUT,
+                 dns_servers=None, alert_sinks=None):
+        self.metrics_file = metrics_file
+        self.domain_timing = domain_timing
+        self.fan_out = fan_out
+        self.dns_servers = list(dns_servers or DNS_SERVERS)
+        self.logger, self.consistent_logger, self.inconsistent_logger, self.ip_logger = setup_logging()
+        self.alerts = setup_alerts(alert_sinks)
+        self.rules = load_rules()
+        self.store = nsstore.StateStore(STATE_DB) if STATE_DB else None
+        self.executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+        # 只执行单个查询、不再等待其他任务的线程池：NS 地址解析和各 DNS 的 direct 查询
+        self.address_executor = ThreadPoolExecutor(max_workers=CONCURRENCY)
+        self.last_inconsistent = {}
+
+    def reload_rules(self):
+        self.rules = load_rules()
+
+    def reusable(self, previous):
+        """上次的结果是否覆盖了本轮需要的内容（DNS 列表相同，fan-out 模式下含各上级服务器的结果）"""
+        if set(previous.get("direct") or ()) != set(self.dns_servers):
+            return False
+        return not self.fan_out or "parent_ns" in previous
+
+    def check(self, ns_domains, ip_domains, force=False):
+        """
+        检查一批域名：两份列表合并去重后每个域名只查询一次，结果同时用于两项检查
+        启用状态库时，上次一致且记录仍在 TTL 内的域名直接复用上次结果（force 为真时全部重查）
+        返回本轮不一致的域名集合，各项检查分别的结果保存在 last_inconsistent 中
+        """
+        start = time.monotonic()
+        store = self.store
+        need_ips = set(ip_domains)
+        results = {}
+        cached = set()
+        preload = store.fresh_addresses() if store is not None and not force else {}
+        resolver = NsAddressResolver(CONCURRENCY, preload, self.address_executor)
+        # 并发查询，报告阶段按各自列表中的顺序输出，保证结果顺序稳定
+        for domain in ns_domains + ip_domains:
+            if domain in results:
+                continue
+            previous = None
+            if store is not None and not force:
+                previous = store.fresh_result(domain, domain in need_ips)
+                if previous is not None and not self.reusable(previous):
+                    previous = None
+            if previous is not None:
+                results[domain] = Future()
+                results[domain].set_result(previous)
+                cached.add(domain)
+            else:
+                results[domain] = self.executor.submit(resolve_domain, domain, domain in need_ips,
+                                                       resolver, self.domain_timing, self.fan_out,
+                                                       self.dns_servers, self.address_executor)
+
+        inconsistent = set()
+        self.last_inconsistent = {}
+        if ns_domains:
+            self.logger.info(f"==================================================== 检查时间：{datetime.now()} ===============================================================")
+            ns_inconsistent = report_ns((self.logger, self.consistent_logger, self.inconsistent_logger),
+                                        ns_domains, results, store, cached, self.dns_servers)
+            nsmetrics.REGISTRY.set("nscheck_inconsistent_domains", len(ns_inconsistent), check="ns")
+            inconsistent |= ns_inconsistent
+            self.last_inconsistent["ns"] = ns_inconsistent
+        if ip_domains:
+            self.ip_logger.info(f"\n======================================= 检查时间：{datetime.now()} ================================================")
+            ip_inconsistent = report_ip(self.ip_logger, ip_domains, results, self.rules, store, cached,
+                                        self.dns_servers)
+            nsmetrics.REGISTRY.set("nscheck_inconsistent_domains", len(ip_inconsistent), check="ip")
+            inconsistent |= ip_inconsistent
+            self.last_inconsistent["ip"] = ip_inconsistent
+
+        if store is not None:
+            # 只缓存本次新查询且一致的结果，不一致的域名下次继续重查以便及时发现恢复
+            for domain, future in results.items():
+                if domain in cached or domain in inconsistent:
+                    continue
+                result = future.result()
+                store.save_result(domain, result, min(result["ttl"], MAX_STATE_AGE), domain in need_ips)
+            for (server, name), (addresses, ttl) in resolver.export().items():
+                store.save_addresses(server, name, addresses, min(ttl, MAX_STATE_AGE))
+            store.commit()
+        self.record_run(len(results), len(cached), time.monotonic() - start)
+        return inconsistent
+
+    def record_run(self, domains, cached, elapsed):
+        registry = nsmetrics.REGISTRY
+        registry.inc("nscheck_runs_total")
+        registry.set("nscheck_run_duration_seconds", elapsed)
+        registry.set("nscheck_run_domains", domains)
+        registry.set("nscheck_run_cached_domains", cached)
+        registry.set("nscheck_domains_per_second", domains / elapsed if elapsed > 0 else 0.0)
+        registry.set("nscheck_last_run_timestamp_seconds", time.time())
+        registry.set("nscheck_referral_cache_hits", dnsquery.REFERRAL_CACHE.hits)
+        registry.set("nscheck_referral_cache_misses", dnsquery.REFERRAL_CACHE.misses)
+        self.logger.debug(f"⏱ 本轮 {domains} 个域名（复用 {cached} 个），耗时 {elapsed:.2f}s")
+        if self.metrics_file:
+            try:
+                nsmetrics.write_textfile(self.metrics_file)
+            except OSError as e:
+                self.logger.warning(f"写入指标文件 {self.metrics_file} 失败: {e}")
+
+    def close(self):
+        self.executor.shutdown()
+        self.address_executor.shutdown()
+        if self.store is not None:
+            self.store.close()
+        shutdown_alerts()
+        shutdown_logging()
+
+def lock_files(checks=("ns", "ip")):
+    return [LOCK_FILE.format(check) for check in sorted(checks)]
+
+def acquire_lock(checks=("ns", "ip")):
+    """
+    获取各项检查的进程锁，防止同一项检查的 cron 任务之间、cron 与常驻进程之间重叠运行；
+    分别运行的 check_ns.py 和 check_ip.py 各用各的锁，可以同时运行，合并运行和常驻进程同时持有两把锁
+    任一把锁已被占用时释放已获取的锁并返回 None，否则返回持有这些锁的上下文管理器
+    """
+    stack = contextlib.ExitStack()
+    for path in lock_files(checks):
+        f = stack.enter_context(open(path, "w"))
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            stack.close()
+            return None
+    return stack
+
+def run(checks=("ns", "ip"), force=False, metrics_file=METRICS_FILE, domain_timing=DOMAIN_TIMING,
+        fan_out=FAN_OUT, dns_servers=None, alert_sinks=None):
+    """统一检查入口：读取 dns-ns.txt 和 dns-ip.txt，检查一轮后退出（退出前发出合并窗口内剩余的告警）"""
+    checker = Checker(metrics_file, domain_timing, fan_out, dns_servers, alert_sinks)
+    ns_domains, ip_domains = [], []
+    if "ns" in checks:
+        try:
+            ns_domains = read_domains(NS_DNS_FILE)
+        except FileNotFoundError:
+            checker.logger.error(f"文件 {NS_DNS_FILE} 未找到。")
+    if "ip" in checks:
+        try:
+            ip_domains = read_domains(IP_DNS_FILE)
+        except FileNotFoundError:
+            checker.ip_logger.error(f"[ERROR] 文件 {IP_DNS_FILE} 未找到。")
+    try:
+        checker.check(ns_domains, ip_domains, force)
+    finally:
+        checker.close()
+
+def main(checks=("ns", "ip")):
+    parser = argparse.ArgumentParser(description="检查域名 NS 及 NS 对应 IP 的一致性")
+    parser.add_argument("--force", action="store_true", help="忽略 TTL，全部重新查询")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="本轮结束后写入 Prometheus textfile（如 node_exporter 的 textfile 目录下的 nscheck.prom）")
+    parser.add_argument("--domain-timing", action="store_true", default=DOMAIN_TIMING,
+                        help="指标中包含每个域名 direct/trace/ns_addr 各阶段的耗时")
+    parser.add_argument("--fan-out", action="store_true", default=FAN_OUT,
+                        help="向上级 zone 的全部权威服务器并发查询，并对比各服务器给出的 NS")
+    parser.add_argument("--dns-server", action="append", dest="dns_servers", metavar="IP",
+                        help=f"需要检查的递归 DNS，可重复指定多个，默认 {', '.join(DNS_SERVERS)}")
+    parser.add_argument("--alert-file", default=ALERT_FILE, help="告警写入该文件（JSON-lines）而不调用告警脚本")
+    parser.add_argument("--alert-socket", default=ALERT_SOCKET, help="告警发到该 unix socket 而不调用告警脚本")
+    args = parser.parse_args()
+    lock = acquire_lock(checks)
+    if lock is None:
+        print(f"另一个检查进程正在运行（{', '.join(lock_files(checks))}），本次跳过")
+        return
+    with lock:
+        run(checks, force=args.force, metrics_file=args.metrics_file, domain_timing=args.domain_timing,
+            fan_out=args.fan_out, dns_servers=args.dns_servers,
+            alert_sinks=alert_sinks(args.alert_file, args.alert_socket))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+检查日志的异步写入：各 logger 只把记录放入内存队列，由单独的线程（QueueListener）格式化并写盘，
+日志 I/O 不会阻塞检查；所有文件按大小或按时间轮转
+
+每个域名的每项检查产生一条结构化记录（LogRecord 的 event 属性），写入 JSON-lines 文件便于检索；
+人可读的日志（带 emoji 的 dns-ns.log / dns-ip.log）由同一条记录在写盘线程中渲染生成
+"""
+import os
+import json
+import queue
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+MAX_BYTES = 100 * 1024 * 1024  # 单个日志文件超过这个大小时轮转，0 为不按大小轮转
+ROTATE_WHEN = "midnight"       # 按时间轮转的周期（TimedRotatingFileHandler 的 when），None 为不按时间轮转
+BACKUP_COUNT = 7               # 保留的历史文件数
+
+class RotatingHandler(TimedRotatingFileHandler):
+    """按时间或大小轮转，先满足哪个条件就轮转"""
+
+    def __init__(self, path, max_bytes=MAX_BYTES, when=ROTATE_WHEN, backup_count=BACKUP_COUNT):
+        super().__init__(path, when=when or "D", backupCount=backup_count, encoding="utf-8")
+        self.max_bytes = max_bytes
+        self.rotate_by_time = when is not None
+
+    def shouldRollover(self, record):
+        if self.rotate_by_time and super().shouldRollover(record):
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            if self.stream.tell() >= self.max_bytes:
+                return True
+        return False
+
+    def rotation_filename(self, default_name):
+        # 同一周期内按大小多次轮转时，历史文件名再加序号，避免覆盖之前的文件；
+        # 序号补零并且总是取已有的最大序号加一（不重用删掉的文件名），
+        # 按文件名排序即为轮转顺序，超出 BACKUP_COUNT 时按文件名删除的是最早的文件
+        name = super().rotation_filename(default_name)
+        directory, base = os.path.split(name)
+        numbers = [int(f[len(base) + 1:]) for f in os.listdir(directory or ".")
+                   if f.startswith(base + ".") and f[len(base) + 1:].isdigit()]
+        if not numbers and not os.path.exists(name):
+            return name
+        return f"{name}.{max(numbers, default=0) + 1:03d}"
+
+class HumanFormatter(logging.Formatter):
+    """
+    普通记录照常格式化；带 event 的记录交给 render(event) 展开为 [(级别, 文本)]，
+    每一行单独加上时间和级别前缀，与逐行调用 logger 的输出相同
+    """
+
+    def __init__(self, fmt, render):
+        super().__init__(fmt)
+        self.render = render
+
+    def format(self, record):
+        event = getattr(record, "event", None)
+        if event is None:
+            return super().format(record)
+        lines = []
+        for level, text in self.render(event):
+            line = logging.makeLogRecord(dict(record.__dict__, msg=text, args=None, levelno=level,
+                                              levelname=logging.getLevelName(level), event=None))
+            lines.append(super().format(line))
+        return "\n".join(lines)
+
+class JsonFormatter(logging.Formatter):
+    """每条记录一行 JSON：时间、级别、logger 名，以及 event 中的全部字段"""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+        }
+        data.update(getattr(record, "event", None) or {"message": record.getMessage()})
+        return json.dumps(data, ensure_ascii=False)
+
+def has_event(record):
+    return getattr(record, "event", None) is not None
+
+class LogPipeline:
+    """
+    一组 logger 共用一个队列和写盘线程
+    add_file(path, formatter, logger_names, record_filter) 注册输出文件，attach(name, level) 得到写入队列的 logger
+    """
+
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.handlers = []
+        self.loggers = []
+        self.listener = None
+
+    def add_file(self, path, formatter, logger_names=None, record_filter=None, level=logging.DEBUG):
+        handler = RotatingHandler(path)
+        handler.setLevel(level)
+        handler.setFormatter(formatter)
+        if logger_names is not None:
+            names = set(logger_names)
+            handler.addFilter(lambda record: record.name in names)
+        if record_filter is not None:
+            handler.addFilter(record_filter)
+        self.handlers.append(handler)
+        return handler
+
+    def attach(self, name, level=logging.INFO):
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.propagate = False
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.addHandler(QueueHandler(self.queue))
+        self.loggers.append(logger)
+        return logger
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+        return self
+
+    def stop(self):
+        """写完队列中剩余的记录后关闭文件"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        for logger in self.loggers:
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+        for handler in self.handlers:
+            handler.close()
@@ -0,0 +1,195 @@
+"""
+检查过程的指标：每次 DNS 查询的延迟直方图（按查询类别和目标服务器）、超时/错误计数、
+每轮耗时和域名/秒，可选每个域名各阶段的耗时
+输出为 Prometheus 文本格式，写入 textfile（供 node_exporter 采集）或由本地 HTTP /metrics 提供
+"""
+import os
+import time
+import threading
+import contextvars
+import dnsquery
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 查询延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+HELP = {
+    "nscheck_query_duration_seconds": ("histogram", "单次 DNS 查询（含重试）的耗时"),
+    "nscheck_queries_total": ("counter", "DNS 查询次数，按结果 ok/timeout/error 区分"),
+    "nscheck_runs_total": ("counter", "已完成的检查轮数"),
+    "nscheck_run_duration_seconds": ("gauge", "最近一轮检查的耗时"),
+    "nscheck_run_domains": ("gauge", "最近一轮检查的域名数（去重后）"),
+    "nscheck_run_cached_domains": ("gauge", "最近一轮中直接复用状态库结果的域名数"),
+    "nscheck_domains_per_second": ("gauge", "最近一轮的检查速度"),
+    "nscheck_inconsistent_domains": ("gauge", "最近一轮各项检查的不一致域名数"),
+    "nscheck_resolver_inconsistent_domains": ("gauge", "最近一轮各项检查中与 trace 不一致的域名数，按递归 DNS 区分"),
+    "nscheck_last_run_timestamp_seconds": ("gauge", "最近一轮检查完成的时间"),
+    "nscheck_referral_cache_hits": ("gauge", "委派缓存累计命中次数"),
+    "nscheck_referral_cache_misses": ("gauge", "委派缓存累计未命中次数"),
+    "nscheck_domain_duration_seconds": ("gauge", "最近一次检查该域名各阶段的耗时"),
+}
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+class Registry:
+    """线程安全的指标集合，按 (指标名, 标签) 保存计数器、仪表和直方图"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+
+    def render(self):
+        """Prometheus 文本格式"""
+        with self.lock:
+            families = {}
+            for (name, labels), value in sorted(self.counters.items()):
+                families.setdefault(name, []).append(_sample(name, labels, value))
+            for (name, labels), value in sorted(self.gauges.items()):
+                families.setdefault(name, []).append(_sample(name, labels, value))
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                samples = families.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    samples.append(_sample(name + "_bucket", labels + (("le", repr(bound)),), cumulative))
+                samples.append(_sample(name + "_bucket", labels + (("le", "+Inf"),), histogram.count))
+                samples.append(_sample(name + "_sum", labels, histogram.sum))
+                samples.append(_sample(name + "_count", labels, histogram.count))
+        lines = []
+        for name in sorted(families):
+            kind, text = HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(families[name])
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _sample(name, labels, value):
+    if labels:
+        name += "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+    return f"{name} {value}"
+
+REGISTRY = Registry()
+
+# 当前正在进行的查询类别（direct / trace / ns_addr），由调用方用 query_kind 标注；
+# 使用 contextvars，dnsquery 把查询分派到线程池时会带上调用方的标注
+_query_kind = contextvars.ContextVar("query_kind", default=None)
+
+@contextmanager
+def query_kind(kind):
+    token = _query_kind.set(kind)
+    try:
+        yield
+    finally:
+        _query_kind.reset(token)
+
+def observe_query(server, qtype, seconds, error, registry=REGISTRY):
+    """dnsquery.QUERY_OBSERVERS 的回调：记录一次查询的耗时和结果"""
+    kind = _query_kind.get() or "other"
+    if error is None:
+        status = "ok"
+    elif isinstance(error, dnsquery.DNSTimeout):
+        status = "timeout"
+    else:
+        status = "error"
+    registry.observe("nscheck_query_duration_seconds", seconds, kind=kind, server=server)
+    registry.inc("nscheck_queries_total", kind=kind, server=server, result=status)
+
+class DomainTimer:
+    """记录一个域名各阶段的耗时，enabled 为假时不产生任何指标（避免按域名的标签过多）"""
+
+    def __init__(self, domain, enabled, registry=REGISTRY):
+        self.domain = domain
+        self.enabled = enabled
+        self.registry = registry
+        self.start = time.monotonic()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            if self.enabled:
+                self.registry.set("nscheck_domain_duration_seconds", time.monotonic() - start,
+                                  domain=self.domain, phase=name)
+
+    def finish(self):
+        if self.enabled:
+            self.registry.set("nscheck_domain_duration_seconds", time.monotonic() - self.start,
+                              domain=self.domain, phase="total")
+
+def write_textfile(path, registry=REGISTRY):
+    """先写临时文件再改名，node_exporter 不会读到写了一半的文件"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(registry.render())
+    os.replace(tmp, path)
+
+def serve(port, address="127.0.0.1", registry=REGISTRY):
+    """在后台线程中提供 http://address:port/metrics，返回 server，调用 shutdown() 停止"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
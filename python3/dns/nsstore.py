@@ -0,0 +1,164 @@
+import json
+import sqlite3
+import time
+
+class StateStore:
+    """
+    跨次运行的检查状态（SQLite）：
+      results  每个域名最近一次的查询结果及其过期时间（由记录 TTL 决定）
+      status   每项检查下每个域名最近一次的一致/不一致状态，用于只在状态变化时告警
+      ns_addresses  NS 主机名在各服务器上解析出的 A/AAAA 地址及其过期时间
+      whois    每个域名最近一次 whois 得到的 NS 列表、查询时间、最近变化时间和最近的错误
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # 常驻进程中可能由创建线程之外的线程使用，调用方保证同一时刻只有一个线程访问
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                domain TEXT PRIMARY KEY,
+                checked_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                with_ips INTEGER NOT NULL,
+                result TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS status (
+                check_name TEXT NOT NULL,
+                domain TEXT NOT NULL,
+                consistent INTEGER NOT NULL,
+                changed_at REAL NOT NULL,
+                PRIMARY KEY (check_name, domain)
+            );
+            CREATE TABLE IF NOT EXISTS ns_addresses (
+                server TEXT NOT NULL,
+                name TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                addresses TEXT NOT NULL,
+                PRIMARY KEY (server, name)
+            );
+            CREATE TABLE IF NOT EXISTS whois (
+                domain TEXT PRIMARY KEY,
+                name_servers TEXT,
+                checked_at REAL NOT NULL,
+                changed_at REAL,
+                error TEXT
+            );
+        """)
+
+    def fresh_result(self, domain, need_ips, now=None):
+        """返回仍在 TTL 内的查询结果；需要 IP 而缓存中没有时视为过期"""
+        now = time.time() if now is None else now
+        row = self.conn.execute(
+            "SELECT expires_at, with_ips, result FROM results WHERE domain = ?", (domain,)).fetchone()
+        if row is None or row[0] <= now or (need_ips and not row[1]):
+            return None
+        return _decode(json.loads(row[2]))
+
+    def save_result(self, domain, result, ttl, with_ips, now=None):
+        now = time.time() if now is None else now
+        self.conn.execute(
+            "INSERT OR REPLACE INTO results (domain, checked_at, expires_at, with_ips, result) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (domain, now, now + max(ttl, 0), int(with_ips), json.dumps(_encode(result))))
+
+    def fresh_addresses(self, now=None):
+        """返回所有仍在 TTL 内的 NS 地址：(服务器, 主机名) -> (地址集合, 剩余 TTL)"""
+        now = time.time() if now is None else now
+        rows = self.conn.execute(
+            "SELECT server, name, expires_at, addresses FROM ns_addresses WHERE expires_at > ?", (now,))
+        return {(server, name): (set(json.loads(addresses)), int(expires_at - now))
+                for server, name, expires_at, addresses in rows}
+
+    def save_addresses(self, server, name, addresses, ttl, now=None):
+        now = time.time() if now is None else now
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ns_addresses (server, name, expires_at, addresses) VALUES (?, ?, ?, ?)",
+            (server, name, now + max(ttl, 0), json.dumps(sorted(addresses))))
+
+    def update_status(self, check_name, domain, consistent, now=None):
+        """记录最新状态，返回之前的状态（True/False，首次出现为 None）"""
+        now = time.time() if now is None else now
+        row = self.conn.execute(
+            "SELECT consistent FROM status WHERE check_name = ? AND domain = ?",
+            (check_name, domain)).fetchone()
+        previous = None if row is None else bool(row[0])
+        if previous != consistent:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO status (check_name, domain, consistent, changed_at) "
+                "VALUES (?, ?, ?, ?)", (check_name, domain, int(consistent), now))
+        return previous
+
+    def fresh_whois(self, domains, refresh_age, error_age, changed_age, changed_window, now=None):
+        """
+        返回不需要重新查询的域名：{域名: NS 列表，上次出错时为 None}
+        上次出错的域名 error_age 秒后重查，changed_window 秒内 NS 有变化的域名 changed_age 秒后重查，
+        其余 refresh_age 秒后重查
+        """
+        now = time.time() if now is None else now
+        wanted = set(domains)
+        fresh = {}
+        for domain, name_servers, checked_at, changed_at, error in self.conn.execute(
+                "SELECT domain, name_servers, checked_at, changed_at, error FROM whois"):
+            if domain not in wanted:
+                continue
+            if error is not None:
+                age = error_age
+            elif changed_at is not None and now - changed_at < changed_window:
+                age = changed_age
+            else:
+                age = refresh_age
+            if checked_at + age > now:
+                fresh[domain] = None if error is not None else json.loads(name_servers)
+        return fresh
+
+    def save_whois(self, domain, name_servers, now=None):
+        """记录一次成功的 whois 结果，返回之前的 NS 列表（首次为 None）"""
+        now = time.time() if now is None else now
+        row = self.conn.execute(
+            "SELECT name_servers, changed_at FROM whois WHERE domain = ?", (domain,)).fetchone()
+        previous = None if row is None or row[0] is None else json.loads(row[0])
+        changed_at = row[1] if row is not None else None
+        if previous is not None and previous != name_servers:
+            changed_at = now
+        self.conn.execute(
+            "INSERT OR REPLACE INTO whois (domain, name_servers, checked_at, changed_at, error) "
+            "VALUES (?, ?, ?, ?, NULL)", (domain, json.dumps(name_servers), now, changed_at))
+        return previous
+
+    def save_whois_error(self, domain, error, now=None):
+        """记录一次失败的 whois 查询，保留之前的 NS 列表"""
+        now = time.time() if now is None else now
+        cursor = self.conn.execute(
+            "UPDATE whois SET checked_at = ?, error = ? WHERE domain = ?", (now, error, domain))
+        if cursor.rowcount == 0:
+            self.conn.execute(
+                "INSERT INTO whois (domain, name_servers, checked_at, changed_at, error) "
+                "VALUES (?, NULL, ?, NULL, ?)", (domain, now, error))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+def _encode(value):
+    """集合转为排序后的列表，便于 JSON 存储"""
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+    return value
+
+def _decode(result):
+    result["trace_ns"] = set(result.get("trace_ns") or ())
+    result["trace_ns_ips"] = {ns: set(ips) for ns, ips in (result.get("trace_ns_ips") or {}).items()}
+    # 按 DNS 区分的 direct 结果；旧格式（单个 DNS）的记录没有这两项，由调用方视为过期
+    result["direct"] = {server: set(ns) for server, ns in (result.get("direct") or {}).items()}
+    result["direct_ips"] = {server: {ns: set(ips) for ns, ips in ns_ips.items()}
+                            for server, ns_ips in (result.get("direct_ips") or {}).items()}
+    if "parent_ns" in result:
+        result["parent_ns"] = {server: None if ns is None else set(ns)
+                               for server, ns in result["parent_ns"].items()}
+    return result
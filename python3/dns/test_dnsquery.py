@@ -0,0 +1,74 @@
+"""dnsquery 报文解析对截断和畸形报文的处理；运行：python3 -m unittest test_dnsquery"""
+import socket
+import threading
+import unittest
+
+import dnsquery
+import dnsstub
+from dnsquery import Record
+
+def full_response(qid=0x1234):
+    answer = [
+        Record("example.com", dnsquery.TYPE_MX, 300, (10, "mx1.example.com")),
+        Record("example.com", dnsquery.TYPE_A, 300, "192.0.2.1"),
+        Record("example.com", dnsquery.TYPE_TXT, 300, "hello"),
+    ]
+    authority = [
+        Record("example.com", dnsquery.TYPE_SOA, 300,
+               ("ns1.example.com", "hostmaster.example.com", 1, 3600, 900, 604800, 300)),
+        Record("example.com", dnsquery.TYPE_NS, 300, "ns1.example.com"),
+    ]
+    return dnsstub.build_response(qid, ("example.com", dnsquery.TYPE_MX), answer=answer,
+                                  authority=authority, edns_size=1232)
+
+class ParseTest(unittest.TestCase):
+    def test_full_response(self):
+        response = dnsquery.parse_message(full_response())
+        self.assertEqual(response.answer[0].data, (10, "mx1.example.com"))
+        self.assertEqual(response.authority[0].data[:2], ("ns1.example.com", "hostmaster.example.com"))
+
+    def test_truncated_packets_raise_dns_error(self):
+        for data in (full_response(), dnsquery.build_query("example.com", dnsquery.TYPE_NS)[0]):
+            for length in range(len(data)):
+                with self.subTest(length=length):
+                    try:
+                        dnsquery.parse_message(data[:length])
+                    except dnsquery.DNSError:
+                        pass
+
+    def test_short_rdata_raises_dns_error(self):
+        # 把 MX 记录的 RDLENGTH 改为 1：记录本身完整，但 rdata 不足以解析
+        data = bytearray(full_response())
+        question_end = 12 + len(dnsquery.encode_name("example.com")) + 4
+        rdlength_at = question_end + 2 + 8  # 压缩的 owner 名（2 字节）之后是 TYPE、CLASS、TTL
+        data[rdlength_at:rdlength_at + 2] = b"\x00\x01"
+        with self.assertRaises(dnsquery.DNSError):
+            dnsquery.parse_message(bytes(data[:question_end + 2 + 10 + 1]))
+
+class QueryUdpTest(unittest.TestCase):
+    def test_malformed_datagram_is_dropped(self):
+        """在真正的应答之前先收到截断的报文：丢弃后继续等待，而不是让整个查询失败"""
+        server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        server.bind(("127.0.0.1", 0))
+        port = server.getsockname()[1]
+        message, qid = dnsquery.build_query("example.com", dnsquery.TYPE_MX, qid=0x1234)
+
+        def serve():
+            data, client = server.recvfrom(65535)
+            reply = full_response(qid)
+            server.sendto(reply[:26], client)
+            server.sendto(reply, client)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        try:
+            response = dnsquery.query_udp("127.0.0.1", message, qid, "example.com", dnsquery.TYPE_MX,
+                                          timeout=2, port=port)
+        finally:
+            thread.join(timeout=2)
+            server.close()
+        self.assertIsNotNone(response)
+        self.assertEqual(response.answer[0].data, (10, "mx1.example.com"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+"""
+内置的 whois 客户端（TCP 43 端口）和并发采集：
+按顶级域找到 whois 服务器，每台服务器单独的令牌桶限速，被限流或连接失败时按指数退避，
+不同服务器之间互不影响；查询在线程池中进行，限速和调度在调用线程中完成
+"""
+import re
+import time
+import random
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+WHOIS_PORT = 43
+QUERY_TIMEOUT = 10         # 单次查询的连接和读取超时（秒）
+MAX_RESPONSE = 1024 * 1024
+WORKERS = 16               # 同时在途的 whois 查询数
+MAX_RETRIES = 3            # 被限流或连接失败后的重试次数
+DEFAULT_RATE = 1.0         # 每台 whois 服务器默认每秒查询数
+DEFAULT_BURST = 2          # 令牌桶容量
+BACKOFF_BASE = 2.0         # 第一次退避的时长（秒），之后每次翻倍
+BACKOFF_MAX = 120.0
+IANA_SERVER = "whois.iana.org"
+
+# 顶级域 -> whois 服务器，未列出的顶级域向 IANA 查询（结果缓存在进程内）
+TLD_SERVERS = {
+    "com": "whois.verisign-grs.com",
+    "net": "whois.verisign-grs.com",
+    "org": "whois.publicinterestregistry.org",
+    "cn": "whois.cnnic.cn",
+    "io": "whois.nic.io",
+    "info": "whois.nic.info",
+    "top": "whois.nic.top",
+    "xyz": "whois.nic.xyz",
+}
+
+# 部分服务器需要特定的查询格式，否则会返回同名主机等多条记录
+QUERY_FORMATS = {
+    "whois.verisign-grs.com": "domain {}",
+    "whois.denic.de": "-T dn,ace {}",
+}
+
+# whois 服务器 -> (每秒查询数, 令牌桶容量)，未列出的使用 DEFAULT_RATE / DEFAULT_BURST
+SERVER_RATES = {
+    "whois.cnnic.cn": (0.5, 1),
+}
+
+# 应答中出现这些内容时视为被限流
+RATE_LIMIT_MARKERS = ("limit exceeded", "rate limit", "too many", "try again later",
+                      "interval is too short", "quota exceeded", "exceeded the maximum")
+NOT_FOUND_MARKERS = ("no match for", "not found", "no data found", "no entries found", "no object found")
+NAME_SERVER_PATTERN = re.compile(r"^[ \t]*(?:name ?servers?|nserver)[ \t]*:[ \t]*(\S+)", re.I | re.M)
+
+class WhoisError(Exception):
+    """whois 查询失败"""
+
+class WhoisRateLimited(WhoisError):
+    """被 whois 服务器限流或拒绝连接，退避后可重试"""
+
+def query(server, text, timeout=QUERY_TIMEOUT, port=None):
+    """向 whois 服务器发送一行查询，读取到连接关闭为止，返回文本"""
+    try:
+        with socket.create_connection((server, port or WHOIS_PORT), timeout=timeout) as sock:
+            sock.sendall((text.encode() if text.isascii() else text.encode("idna")) + b"\r\n")
+            chunks, size = [], 0
+            while size < MAX_RESPONSE:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                size += len(chunk)
+    except (ConnectionRefusedError, ConnectionResetError) as e:
+        raise WhoisRateLimited(f"{server}: {e}") from e
+    except socket.timeout as e:
+        raise WhoisRateLimited(f"{server}: 超时") from e
+    except OSError as e:
+        raise WhoisError(f"{server}: {e}") from e
+    reply = b"".join(chunks).decode("utf-8", errors="replace")
+    lowered = reply.lower()
+    if any(marker in lowered for marker in RATE_LIMIT_MARKERS):
+        raise WhoisRateLimited(f"{server}: {reply.strip().splitlines()[0] if reply.strip() else '限流'}")
+    return reply
+
+def parse_name_servers(reply):
+    """从 whois 应答中取出 NS 主机名（小写、不带末尾的点、去重并保持顺序），未注册时返回空列表"""
+    lowered = reply.lower()
+    if any(marker in lowered for marker in NOT_FOUND_MARKERS) and not NAME_SERVER_PATTERN.search(reply):
+        return []
+    names = []
+    for match in NAME_SERVER_PATTERN.finditer(reply):
+        name = match.group(1).strip().rstrip(".").lower()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+_iana_cache = {}
+_iana_lock = threading.Lock()
+
+def server_for(domain):
+    """域名的 whois 服务器：按最长的已知后缀查 TLD_SERVERS，否则向 IANA 查询顶级域的 refer"""
+    labels = domain.lower().rstrip(".").split(".")
+    for i in range(len(labels)):
+        server = TLD_SERVERS.get(".".join(labels[i:]))
+        if server:
+            return server
+    tld = labels[-1]
+    with _iana_lock:
+        if tld in _iana_cache:
+            return _iana_cache[tld]
+    match = re.search(r"^[ \t]*(?:refer|whois)[ \t]*:[ \t]*(\S+)", query(IANA_SERVER, tld), re.I | re.M)
+    server = match.group(1).lower() if match else None
+    with _iana_lock:
+        _iana_cache[tld] = server
+    return server
+
+def lookup(server, domain):
+    """查询域名的 NS 列表"""
+    return parse_name_servers(query(server, QUERY_FORMATS.get(server, "{}").format(domain)))
+
+class TokenBucket:
+    """一台 whois 服务器的限速：每秒补充 rate 个令牌，最多 burst 个；被限流后在 blocked_until 之前不再查询"""
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.failures = 0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now):
+        """下一次可以查询的时间"""
+        self._refill(now)
+        if self.blocked_until > now:
+            return self.blocked_until
+        if self.tokens >= 1:
+            return now
+        return now + (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def backoff(self, now):
+        """指数退避并加入随机抖动，返回退避的秒数"""
+        self.failures += 1
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1)) * random.uniform(1, 1.5)
+        self.blocked_until = max(self.blocked_until, now + delay)
+        self.tokens = 0
+        return delay
+
+    def succeed(self):
+        self.failures = 0
+
+class RateLimits:
+    """各 whois 服务器的令牌桶，常驻进程中在各轮之间保留（退避状态也随之保留）"""
+
+    def __init__(self, rates=None):
+        self.rates = SERVER_RATES if rates is None else rates
+        self.buckets = {}
+
+    def bucket(self, server):
+        bucket = self.buckets.get(server)
+        if bucket is None:
+            bucket = self.buckets[server] = TokenBucket(*self.rates.get(server, (DEFAULT_RATE, DEFAULT_BURST)))
+        return bucket
+
+def collect(domains, limits=None, workers=WORKERS, retries=MAX_RETRIES, lookup=lookup):
+    """
+    并发查询一批域名的 NS，返回 {域名: NS 列表 或 WhoisError}
+    每台服务器按各自的令牌桶发出查询，被限流的服务器退避后重试，其余服务器照常进行
+    lookup(server, domain) 可替换为其他实现（如 whois 包）
+    """
+    limits = limits or RateLimits()
+    results = {}
+    pending = {}  # 服务器 -> deque[(域名, 已重试次数)]
+    for domain in dict.fromkeys(domains):
+        try:
+            server = server_for(domain)
+        except WhoisError as e:
+            results[domain] = e
+            continue
+        if server is None:
+            results[domain] = WhoisError(f"找不到 {domain} 的 whois 服务器")
+            continue
+        pending.setdefault(server, deque()).append((domain, 0))
+
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or in_flight:
+            now = time.monotonic()
+            next_ready = None
+            for server in list(pending):
+                queue, bucket = pending[server], limits.bucket(server)
+                while queue and len(in_flight) < workers:
+                    ready = bucket.ready_at(now)
+                    if ready > now:
+                        next_ready = ready if next_ready is None else min(next_ready, ready)
+                        break
+                    bucket.take(now)
+                    domain, attempt = queue.popleft()
+                    in_flight[executor.submit(lookup, server, domain)] = (server, domain, attempt)
+                if not queue:
+                    del pending[server]
+
+            timeout = None if next_ready is None else max(0.0, next_ready - now)
+            if not in_flight:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                server, domain, attempt = in_flight.pop(future)
+                bucket = limits.bucket(server)
+                try:
+                    results[domain] = future.result()
+                    bucket.succeed()
+                except WhoisRateLimited as e:
+                    bucket.backoff(time.monotonic())
+                    if attempt < retries:
+                        pending.setdefault(server, deque()).append((domain, attempt + 1))
+                    else:
+                        results[domain] = e
+                except WhoisError as e:
+                    results[domain] = e
+                except Exception as e:
+                    results[domain] = WhoisError(str(e))
+    return results
@@ -0,0 +1,79 @@
+"""
+本地桩 whois 服务器：按给定的 {域名: [NS]} 在回环地址上以 Verisign 的格式应答，
+用于离线测试 whoisquery / check_whois；可模拟应答延迟和限流（超过 rate 次/秒时返回限流提示）
+
+用法：
+    server = StubWhoisServer("127.0.0.2", 4343, {"sina.com": ["ns1.sina.com", "ns2.sina.com"]}, rate=5)
+    server.start()
+    whoisquery.TLD_SERVERS = {"com": "127.0.0.2"}
+    whoisquery.WHOIS_PORT = 4343
+    ...
+    server.stop()
+"""
+import socketserver
+import threading
+import time
+
+RATE_LIMITED_REPLY = "WHOIS LIMIT EXCEEDED - SEE WWW.PIR.ORG/WHOIS FOR DETAILS\r\n"
+
+def format_reply(domain, name_servers):
+    if name_servers is None:
+        return f'No match for "{domain.upper()}".\r\n'
+    lines = [f"   Domain Name: {domain.upper()}"]
+    lines += [f"   Name Server: {ns.upper()}" for ns in name_servers]
+    return "\r\n".join(lines) + "\r\n"
+
+class StubWhoisServer:
+    """在 (address, port) 上监听 TCP；每个应答延迟 latency 秒，每秒超过 rate 次查询时返回限流提示"""
+
+    def __init__(self, address, port, records, latency=0.0, rate=None):
+        self.address = address
+        self.port = port
+        self.records = {domain.lower(): list(ns) for domain, ns in records.items()}
+        self.latency = latency
+        self.rate = rate
+        self.queries = 0
+        self.limited = 0
+        self._lock = threading.Lock()
+        self._window = (0, 0)  # (当前秒, 本秒内的查询数)
+        self._server = None
+
+    def answer(self, text):
+        text = text.strip()
+        for prefix in ("domain ", "="):
+            if text.lower().startswith(prefix):
+                text = text[len(prefix):]
+        with self._lock:
+            self.queries += 1
+            if self.rate is not None:
+                second = int(time.monotonic())
+                count = self._window[1] + 1 if self._window[0] == second else 1
+                self._window = (second, count)
+                if count > self.rate:
+                    self.limited += 1
+                    return RATE_LIMITED_REPLY
+        domain = text.lower().rstrip(".")
+        return format_reply(domain, self.records.get(domain))
+
+    def start(self):
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                line = self.rfile.readline(1024).decode("utf-8", errors="replace")
+                reply = stub.answer(line)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self.wfile.write(reply.encode("utf-8"))
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((self.address, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
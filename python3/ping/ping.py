@@ -1,5 +1,35 @@
 import subprocess
 import platform
+import argparse
+import asyncio
+import csv
+import ipaddress
+import json
+import math
+import os
+import re
+import socket
+import struct
+import time
+
+TIMEOUT = 1.0               # 单次探测超时（秒），与 ping -w 1 保持一致
+DEFAULT_CONCURRENCY = 256   # 默认最大并发探测数
+DEFAULT_RATE = 1000         # 默认发包速率（包/秒）
+BLOCK_SIZE = 256            # 断点与结果落盘的粒度（地址数）
+OUTPUT_FILE = '2021087-new-tong.txt'
+DEFAULT_CIDRS = ['202.108.7.0/24']
+PROBE_INTERVAL = 0.2        # 多探测模式下同一主机相邻两次探测的间隔（秒）
+REPORT_FIELDS = ['host', 'sent', 'received', 'loss', 'min', 'avg', 'p50', 'p99']
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+RTT_PATTERN = re.compile(r'time[=<]\s*([\d.]+)\s*ms', re.IGNORECASE)
+
+def _ping_command(host):
+    """根据不同操作系统生成 ping 命令"""
+    param = '-n' if platform.system().lower() == 'windows' else '-c'
+    timeout = '1000' if platform.system().lower() == 'windows' else '1'
+    return ['ping', param, '1', '-w', timeout, host]
 
 def ping(host):
     """
@@ -7,10 +37,7 @@ def ping(host):
     参数：host - 目标IP地址
     返回：布尔值表示是否可达
     """
-    # 根据不同操作系统设置ping参数
-    param = '-n' if platform.system().lower() == 'windows' else '-c'
-    timeout = '1000' if platform.system().lower() == 'windows' else '1'
-    command = ['ping', param, '1', '-w', timeout, host]
+    command = _ping_command(host)
 
     try:
         # 执行ping命令，超时设置为2秒
@@ -24,26 +51,498 @@ def ping(host):
     except subprocess.TimeoutExpired:
         return False
 
-def main():
-    base_ip = '202.108.7.'
-    reachable_ips = []
+def _checksum(data):
+    """计算 ICMP 校验和"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+def _build_echo(ident, seq):
+    """构造 ICMP Echo Request 报文"""
+    payload = struct.pack('!d', time.monotonic()).ljust(32, b'\x00')
+    header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+    csum = _checksum(header + payload)
+    return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, csum, ident, seq) + payload
+
+class RateLimiter:
+    """按固定间隔放行发包，保证总速率不超过 rate 包/秒"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0
+        self.next_time = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_time <= now:
+            self.next_time = now + self.interval
+            return
+        delay = self.next_time - now
+        self.next_time += self.interval
+        await asyncio.sleep(delay)
+
+class IcmpProber:
+    """
+    非阻塞 ICMP 探测器：所有目标共用一个 socket，通过事件循环收包
+    优先使用免 root 的 SOCK_DGRAM，失败时尝试 SOCK_RAW
+    """
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.loop = asyncio.get_running_loop()
+        self.ident = os.getpid() & 0xffff
+        self.seq = 0
+        self.waiters = {}
+        self.send_waiters = []  # 等待 socket 可写的发送方
+        try:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.raw = False
+        except (PermissionError, OSError):
+            # 无法使用 DGRAM 时退回 RAW，没有权限则由调用方回退到子进程
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.raw = True
+        self.sock.setblocking(False)
+        self.loop.add_reader(self.sock.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            if self.raw:
+                # RAW socket 收到的报文带 IP 头
+                data = data[(data[0] & 0x0f) * 4:]
+            if len(data) < 8:
+                continue
+            icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', data[:8])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            # DGRAM 模式下 ident 由内核改写，只按来源地址和序号匹配
+            if self.raw and ident != self.ident:
+                continue
+            waiter = self.waiters.pop((addr[0], seq), None)
+            if waiter and not waiter.done():
+                waiter.set_result(time.monotonic())
+
+    async def _sendto(self, data, addr):
+        """
+        非阻塞发送；发送缓冲区满时等 socket 可写后重试
+        不用 loop.sock_sendto，它在 Python 3.11 才加入
+        """
+        while True:
+            try:
+                return self.sock.sendto(data, addr)
+            except (BlockingIOError, InterruptedError):
+                pass
+            writable = self.loop.create_future()
+            if not self.send_waiters:
+                self.loop.add_writer(self.sock.fileno(), self._on_writable)
+            self.send_waiters.append(writable)
+            await writable
+
+    def _on_writable(self):
+        self.loop.remove_writer(self.sock.fileno())
+        waiters, self.send_waiters = self.send_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def probe(self, host):
+        """发送一个 Echo Request，返回 RTT（秒），超时返回 None"""
+        self.seq = (self.seq + 1) & 0xffff
+        key = (host, self.seq)
+        waiter = self.loop.create_future()
+        self.waiters[key] = waiter
+        start = time.monotonic()
+        try:
+            await self._sendto(_build_echo(self.ident, self.seq), (host, 0))
+            received = await asyncio.wait_for(waiter, self.timeout)
+            return received - start
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self.waiters.pop(key, None)
+
+    def close(self):
+        self.loop.remove_reader(self.sock.fileno())
+        self.loop.remove_writer(self.sock.fileno())
+        self.sock.close()
+
+class SubprocessProber:
+    """子进程探测器：无法创建 ICMP socket 时回退使用系统 ping 命令"""
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+
+    async def probe(self, host):
+        start = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            *_ping_command(host),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            # 与 ping() 一致，子进程整体超时 2 秒
+            stdout, _ = await asyncio.wait_for(proc.communicate(), self.timeout + 1)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return None
+        if proc.returncode != 0:
+            return None
+        match = RTT_PATTERN.search(stdout.decode('utf-8', 'ignore'))
+        return float(match.group(1)) / 1000 if match else time.monotonic() - start
+
+    def close(self):
+        pass
+
+def open_prober(timeout=TIMEOUT, use_socket=True):
+    """创建探测器，ICMP socket 不可用时回退到子进程"""
+    if use_socket:
+        try:
+            return IcmpProber(timeout)
+        except (PermissionError, OSError):
+            pass
+    return SubprocessProber(timeout)
+
+async def sweep(hosts, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE,
+                timeout=TIMEOUT, use_socket=True, probes=1, interval=PROBE_INTERVAL):
+    """
+    并发探测一批主机，按完成顺序产出 (host, rtts)
+    rtts 为每次探测的 RTT（秒）列表，丢包的探测为 None
+    同时在途的主机数不超过 concurrency，发包速率不超过 rate 包/秒
+    同一主机的多次探测按 interval 错开发出，等待时间互相重叠
+    """
+    prober = open_prober(timeout, use_socket)
+    limiter = RateLimiter(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    pending = set()
+
+    async def probe_once(host, delay):
+        if delay:
+            await asyncio.sleep(delay)
+        await limiter.wait()
+        return await prober.probe(host)
+
+    async def run(host):
+        try:
+            rtts = await asyncio.gather(*(probe_once(host, i * interval) for i in range(probes)))
+            return host, list(rtts)
+        finally:
+            semaphore.release()
+
+    try:
+        for host in hosts:
+            await semaphore.acquire()
+            pending.add(asyncio.ensure_future(run(host)))
+            done = {task for task in pending if task.done()}
+            pending -= done
+            for task in done:
+                yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        prober.close()
 
-    # 遍历0-255所有最后一位IP
-    for i in range(256):
-        current_ip = f"{base_ip}{i}"
-        print(f"正在检测 {current_ip}...", end='\r')
+def percentile(sorted_values, pct):
+    """最近秩法求百分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
 
-        if ping(current_ip):
-            print(f"{current_ip} 可达        ")
-            reachable_ips.append(current_ip)
+def rtt_stats(host, rtts):
+    """汇总单个主机的多次探测结果，时间单位为毫秒"""
+    received = sorted(rtt * 1000 for rtt in rtts if rtt is not None)
+    stats = {'host': host, 'sent': len(rtts), 'received': len(received),
+             'loss': round(1 - len(received) / len(rtts), 4) if rtts else 1.0}
+    if received:
+        stats.update({
+            'min': round(received[0], 3),
+            'avg': round(sum(received) / len(received), 3),
+            'p50': round(percentile(received, 50), 3),
+            'p99': round(percentile(received, 99), 3),
+        })
+    else:
+        stats.update({'min': None, 'avg': None, 'p50': None, 'p99': None})
+    return stats
+
+def report_format(path):
+    """按扩展名判断报告格式：.csv 为 CSV，其余为 JSON lines"""
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+class ReportWriter:
+    """逐行写出延迟报告，支持 CSV 和 JSON lines"""
+
+    def __init__(self, f, fmt):
+        self.f = f
+        self.fmt = fmt
+        if fmt == 'csv':
+            self.writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            if f.tell() == 0:
+                self.writer.writeheader()
+
+    def write(self, stats):
+        if self.fmt == 'csv':
+            self.writer.writerow(stats)
         else:
-            print(f"{current_ip} 不可达      ")
+            self.f.write(json.dumps(stats, separators=(',', ':')) + '\n')
+
+def load_report(path):
+    """读取上一次的延迟报告，返回 host -> 统计信息"""
+    baseline = {}
+    with open(path, 'r', newline='') as f:
+        if report_format(path) == 'csv':
+            for row in csv.DictReader(f):
+                baseline[row['host']] = {
+                    key: (float(value) if value not in ('', None) else None)
+                    for key, value in row.items() if key != 'host'
+                }
+        else:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    baseline[row.pop('host')] = row
+    return baseline
+
+def check_regression(stats, previous, ratio, min_ms, loss_delta):
+    """
+    对比上一次的结果，返回延迟或丢包回退的描述，未回退返回 None
+    基线中有回包的主机本次全部丢包时总是视为回退，与 loss_delta 无关
+    """
+    previous_loss = previous.get('loss') or 0
+    if not stats['received'] and previous_loss < 1:
+        return f"全部丢包（基线丢包率 {previous_loss:.0%}）"
+    reasons = []
+    if stats['p50'] is not None and previous.get('p50') is not None:
+        if stats['p50'] > previous['p50'] * ratio and stats['p50'] - previous['p50'] > min_ms:
+            reasons.append(f"p50 {previous['p50']}ms -> {stats['p50']}ms")
+    if stats['loss'] - previous_loss > loss_delta:
+        reasons.append(f"丢包率 {previous_loss:.0%} -> {stats['loss']:.0%}")
+    return ', '.join(reasons) or None
+
+def load_cidrs(path):
+    """读取网段文件，每行一个 CIDR，支持 # 注释"""
+    cidrs = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                cidrs.append(line)
+    return cidrs
+
+def collapse_networks(cidrs):
+    """解析并合并重叠的网段，保证每个地址只属于一个网段"""
+    networks = [ipaddress.IPv4Network(cidr, strict=False) for cidr in cidrs]
+    return list(ipaddress.collapse_addresses(networks))
+
+def iter_blocks(networks):
+    """按 BLOCK_SIZE 切分网段，产出 (网段, 块序号, 起始地址整数, 地址数)"""
+    for network in networks:
+        first = int(network.network_address)
+        total = network.num_addresses
+        for index in range((total + BLOCK_SIZE - 1) // BLOCK_SIZE):
+            start = index * BLOCK_SIZE
+            yield str(network), index, first + start, min(BLOCK_SIZE, total - start)
+
+class Checkpoint:
+    """
+    断点文件：每个网段记录连续完成的块水位线，以及水位线之后乱序完成的块
+    同时记录各输出文件已确认写入的字节数，恢复时截断掉未确认的部分
+    占用只与网段个数和在途块数有关，与扫描地址总数无关
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sizes = {}
+        self.done = {}
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        self.sizes = state.get('sizes', {})
+        self.done = {cidr: {'next': item['next'], 'extra': set(item['extra'])}
+                     for cidr, item in state.get('done', {}).items()}
+        return True
 
-    # 将结果写入文件
-    with open('2021087-new-tong.txt', 'w') as f:
-        for ip in reachable_ips:
-            f.write(f"{ip}\n")
-    print(f"\n检测完成，找到 {len(reachable_ips)} 个可达IP，结果已保存到 tong.txt")
+    def is_done(self, cidr, index):
+        item = self.done.get(cidr)
+        return bool(item) and (index < item['next'] or index in item['extra'])
+
+    def mark_done(self, cidr, index, sizes):
+        item = self.done.setdefault(cidr, {'next': 0, 'extra': set()})
+        item['extra'].add(index)
+        while item['next'] in item['extra']:
+            item['extra'].remove(item['next'])
+            item['next'] += 1
+        self.sizes = sizes
+        self.save()
+
+    def save(self):
+        state = {
+            'sizes': self.sizes,
+            'done': {cidr: {'next': item['next'], 'extra': sorted(item['extra'])}
+                     for cidr, item in self.done.items()}
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def open_output(self, name, path, resumed):
+        """打开输出文件；恢复时截断到断点确认的长度后继续追加"""
+        if not resumed:
+            return open(path, 'w', newline='')
+        f = open(path, 'a+', newline='')
+        size = self.sizes.get(name, 0)
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='并发 ping 指定网段，将通的 ip 写入文件')
+    parser.add_argument('cidrs', nargs='*',
+                        help=f'要扫描的网段（默认 {" ".join(DEFAULT_CIDRS)}）')
+    parser.add_argument('-f', '--cidr-file',
+                        help='网段文件，每行一个 CIDR')
+    parser.add_argument('-o', '--output', default=OUTPUT_FILE,
+                        help=f'可达 ip 输出文件（默认 {OUTPUT_FILE}）')
+    parser.add_argument('--checkpoint',
+                        help='断点文件（默认为 输出文件.ckpt）')
+    parser.add_argument('--resume', action='store_true',
+                        help='从断点文件继续上次中断的扫描')
+    parser.add_argument('-c', '--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'最大并发探测数（默认 {DEFAULT_CONCURRENCY}）')
+    parser.add_argument('-r', '--rate', type=float, default=DEFAULT_RATE,
+                        help=f'发包速率上限，包/秒，0 表示不限（默认 {DEFAULT_RATE}）')
+    parser.add_argument('-t', '--timeout', type=float, default=TIMEOUT,
+                        help=f'单次探测超时秒数（默认 {TIMEOUT}）')
+    parser.add_argument('--subprocess', action='store_true',
+                        help='强制使用系统 ping 子进程探测')
+    parser.add_argument('-n', '--probes', type=int, default=1,
+                        help='每个主机的探测次数，大于 1 时统计延迟和丢包（默认 1）')
+    parser.add_argument('-i', '--interval', type=float, default=PROBE_INTERVAL,
+                        help=f'同一主机相邻两次探测的间隔秒数（默认 {PROBE_INTERVAL}）')
+    parser.add_argument('--report',
+                        help='延迟报告文件，.csv 结尾为 CSV，否则为 JSON lines')
+    parser.add_argument('--baseline',
+                        help='上一次的延迟报告，用于标记延迟回退的主机')
+    parser.add_argument('--regress-ratio', type=float, default=1.5,
+                        help='p50 超过基线多少倍视为回退（默认 1.5）')
+    parser.add_argument('--regress-ms', type=float, default=5.0,
+                        help='p50 至少增加多少毫秒才视为回退（默认 5）')
+    parser.add_argument('--regress-loss', type=float, default=0.1,
+                        help='丢包率至少增加多少视为回退（默认 0.1）')
+    return parser.parse_args()
+
+async def run_sweep(args):
+    cidrs = list(args.cidrs)
+    if args.cidr_file:
+        cidrs.extend(load_cidrs(args.cidr_file))
+    networks = collapse_networks(cidrs or DEFAULT_CIDRS)
+    baseline = load_report(args.baseline) if args.baseline else {}
+
+    checkpoint = Checkpoint(args.checkpoint or f"{args.output}.ckpt")
+    resumed = args.resume and checkpoint.load()
+    if resumed:
+        print(f"从断点 {checkpoint.path} 恢复扫描")
+    # 丢弃上次中断时未被断点确认的输出
+    out = checkpoint.open_output('output', args.output, resumed)
+    report_file = checkpoint.open_output('report', args.report, resumed) if args.report else None
+    report = ReportWriter(report_file, report_format(args.report)) if report_file else None
+
+    blocks = {}   # 在途块：(网段, 块序号) -> [剩余地址数, 待写入的主机统计列表]
+    owners = {}   # 在途地址 -> 所属块
+    reachable_count = 0
+    regressed_count = 0
+
+    def hosts():
+        for cidr, index, first, count in iter_blocks(networks):
+            if checkpoint.is_done(cidr, index):
+                continue
+            key = (cidr, index)
+            blocks[key] = [count, []]
+            for n in range(first, first + count):
+                ip = str(ipaddress.IPv4Address(n))
+                owners[ip] = key
+                yield ip
+
+    try:
+        async for current_ip, rtts in sweep(hosts(), args.concurrency, args.rate, args.timeout,
+                                            not args.subprocess, args.probes, args.interval):
+            key = owners.pop(current_ip)
+            block = blocks[key]
+            stats = rtt_stats(current_ip, rtts)
+            if stats['received']:
+                if args.probes > 1:
+                    print(f"{current_ip} 可达        avg {stats['avg']}ms p99 {stats['p99']}ms 丢包 {stats['loss']:.0%}")
+                else:
+                    print(f"{current_ip} 可达        ")
+                reachable_count += 1
+            else:
+                print(f"{current_ip} 不可达      ")
+            # 多次探测时报告包含全部丢包的主机，作为下次的基线才能发现由通变为不通的主机
+            if stats['received'] or args.probes > 1:
+                block[1].append(stats)
+
+            previous = baseline.get(current_ip)
+            if previous:
+                reason = check_regression(stats, previous, args.regress_ratio,
+                                          args.regress_ms, args.regress_loss)
+                if reason:
+                    print(f"⚠️  {current_ip} 延迟回退: {reason}")
+                    regressed_count += 1
+
+            block[0] -= 1
+            if block[0] == 0:
+                # 整块完成后按 IP 顺序写入并推进断点
+                del blocks[key]
+                block[1].sort(key=lambda item: socket.inet_aton(item['host']))
+                for item in block[1]:
+                    if item['received']:
+                        out.write(f"{item['host']}\n")
+                    if report:
+                        report.write(item)
+                out.flush()
+                sizes = {'output': out.tell()}
+                if report_file:
+                    report_file.flush()
+                    sizes['report'] = report_file.tell()
+                checkpoint.mark_done(key[0], key[1], sizes)
+    finally:
+        out.close()
+        if report_file:
+            report_file.close()
+
+    checkpoint.remove()
+    print(f"\n检测完成，本次找到 {reachable_count} 个可达IP，结果已保存到 {args.output}")
+    if args.report:
+        print(f"延迟报告已保存到 {args.report}")
+    if args.baseline:
+        print(f"相比基线 {args.baseline}，共 {regressed_count} 个主机延迟或丢包回退")
+
+def main():
+    asyncio.run(run_sweep(parse_args()))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()